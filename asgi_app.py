@@ -0,0 +1,156 @@
+"""Optional ASGI entry point:  uvicorn asgi_app:app --host 0.0.0.0 --port $PORT
+
+The same IDecorBot and Flask app as whatsapp_bot.py, served from an event
+loop. /chat runs handle_message (which may wait on Google Sheets) on its
+own bounded thread pool; every other route goes through the Flask app on a
+separate pool (a2wsgi's). Each route also has a concurrency limit, so a
+burst of slow "Track Order" lookups queues on /chat instead of starving
+/, /upload and static files.
+
+- /chat (POST) is handled here directly and returns the pre-serialized reply bytes.
+- Everything else (/, /upload, /health, static files) is passed to the Flask app.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+
+from whatsapp_bot import app as flask_app, bot, HTTP_SECONDS, PROXY_HOPS, chat_retry_after
+from reply_templates import response_body
+from rate_limit import client_ip
+
+# Threads for handle_message (/chat) and for the Flask app (everything else); neither can starve the other
+CHAT_THREADS = int(os.environ.get("ASGI_CHAT_THREADS", 16))
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 16))
+# Max in-flight requests per route; extra requests wait up to QUEUE_TIMEOUT seconds, then get a 503
+ROUTE_LIMITS = {
+    "/chat": int(os.environ.get("ASGI_CHAT_LIMIT", 64)),
+    "/upload": int(os.environ.get("ASGI_UPLOAD_LIMIT", 4)),
+    "/": int(os.environ.get("ASGI_PAGE_LIMIT", 32)),
+}
+DEFAULT_LIMIT = int(os.environ.get("ASGI_PAGE_LIMIT", 32))
+QUEUE_TIMEOUT = float(os.environ.get("ASGI_QUEUE_TIMEOUT", 10))
+MAX_CHAT_BODY = 64 * 1024
+
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_THREADS, thread_name_prefix="asgi-chat")
+flask_asgi = WSGIMiddleware(flask_app, workers=ASGI_THREADS)
+_limits = {}
+
+
+def _limiter(path):
+    key = path if path in ROUTE_LIMITS else "*"
+    if key not in _limits:
+        _limits[key] = asyncio.Semaphore(ROUTE_LIMITS.get(key, DEFAULT_LIMIT))
+    return _limits[key]
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name: return value.decode("latin-1")
+    return None
+
+
+async def _send_bytes(send, status, body, headers=()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await _send_bytes(send, status, body, [("content-type", "application/json")] + list(headers))
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http": return
+
+    response_started = False
+
+    async def tracked_send(message):
+        nonlocal response_started
+        if message["type"] == "http.response.start": response_started = True
+        await send(message)
+
+    limiter = _limiter(scope["path"])
+    try:
+        await asyncio.wait_for(limiter.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        await _send_json(send, 503, {"error": "Server busy, please retry."}, [("retry-after", "1")])
+        return
+    try:
+        if scope["path"] == "/chat" and scope["method"] == "POST":
+            started = time.perf_counter()
+            status = await chat(scope, receive, tracked_send)
+            # Flask's after_request timer doesn't see this path
+            if status: HTTP_SECONDS.observe(time.perf_counter() - started, "/chat", str(status))
+        else:
+            await flask_asgi(scope, receive, tracked_send)
+    except Exception as e:
+        print(f"[ERROR]: ASGI request {scope['method']} {scope['path']} failed: {e}")
+        # Mid-stream (e.g. Flask's iterator failed) a 500 can't be sent any more; re-raising makes
+        # the server drop the connection, so the client sees a broken response, not a truncated one
+        if response_started: raise
+        await _send_json(send, 500, {"error": "Internal server error"})
+    finally:
+        limiter.release()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            chat_executor.shutdown(wait=False)
+            flask_asgi.executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def chat(scope, receive, send):
+    """Returns the response status, or None if the client went away."""
+    raw = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect": return None
+        raw += message.get("body", b"")
+        if len(raw) > MAX_CHAT_BODY:
+            await _send_json(send, 413, {"error": "Message too large"})
+            return 413
+        if not message.get("more_body"): break
+    try:
+        data = json.loads(raw or b"{}")
+    except ValueError:
+        await _send_json(send, 400, {"error": "Invalid JSON"})
+        return 400
+    if not isinstance(data, dict):
+        await _send_json(send, 400, {"error": "Expected a JSON object"})
+        return 400
+
+    message = data.get('message', '')
+    user_id = data.get('user_id', 'web_guest')
+    if not isinstance(message, str) or not isinstance(user_id, str):
+        await _send_json(send, 400, {"error": "message and user_id must be strings"})
+        return 400
+    remote_addr = scope["client"][0] if scope.get("client") else None
+    retry_after = chat_retry_after(user_id, client_ip(remote_addr, _header(scope, b"x-forwarded-for"), PROXY_HOPS))
+    if retry_after:
+        body, _ = response_body(bot.RATE_LIMITED_MESSAGE)
+        await _send_bytes(send, 429, body, [("content-type", "application/json"), ("access-control-allow-origin", "*"),
+                                           ("retry-after", str(math.ceil(retry_after)))])
+        return 429
+    reply = await asyncio.get_running_loop().run_in_executor(chat_executor, bot.handle_message, user_id, message)
+
+    # Same contract as the Flask /chat view (CORS(app) allows any origin)
+    body, etag = response_body(reply)
+    headers = [("access-control-allow-origin", "*")]
+    if etag: headers.append(("etag", f'"{etag}"'))
+    await _send_bytes(send, 200, body, [("content-type", "application/json")] + headers)
+    return 200
@@ -0,0 +1,67 @@
+"""Micro-benchmark: IntentMatcher vs the old chained any() keyword scans.
+
+Run from the repo root:  python benchmarks/bench_intent_matcher.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_matcher import IntentMatcher
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_intent(msg_lower):
+    # The IDLE-state rules as they were written inline in handle_message
+    if any(w in msg_lower for w in ["track", "order status", "where is my order", "status"]):
+        return "track_order"
+    if any(w in msg_lower for w in ["anime", "marvel", "cars", "gift", "collection"]):
+        return "collection"
+    if any(w in msg_lower for w in ["custom", "personal", "my own photo", "print", "image uploaded"]):
+        return "custom_print"
+    if any(w in msg_lower for w in ["return", "broken", "refund", "shipping", "shipping time", "policy"]):
+        return "policies"
+    if any(w in msg_lower for w in ["checkout", "buy", "cart"]):
+        return "checkout"
+    if "chat upon whatsapp" in msg_lower or "chat on whatsapp" in msg_lower:
+        return "whatsapp"
+    if "place an order" in msg_lower or "cart" in msg_lower:
+        return "place_order"
+    return None
+
+
+# Mostly button presses (menu navigation), plus free text and uploads
+CORPUS = [
+    "🛒 place an order", "📦 track order", "✨ custom print", "🦸 anime collection",
+    "chat on whatsapp", "website product", "custom product", "check order status",
+    "place another order", "where is my order??", "do you ship to pune? what is the shipping time",
+    "i want a marvel poster for my brother's birthday gift", "can i return a broken frame",
+    "[image uploaded] /uploads/3f2a9c1e_img_20240101.jpg", "how much for a3 size",
+    "buy now", "hello there i am looking for something nice for my living room wall",
+    "asdfgh", "is cash on delivery available", "refund status for my last order",
+]
+
+
+def main():
+    matcher = IntentMatcher.from_file(os.path.join(BASE_DIR, "intents.json"))
+    rng = random.Random(42)
+    messages = [rng.choice(CORPUS) for _ in range(10000)]
+
+    mismatches = [m for m in set(messages) if matcher.match(m)[0] != legacy_intent(m)]
+    if mismatches:
+        print(f"MISMATCH on {len(mismatches)} messages: {mismatches[:5]}")
+
+    runs = [
+        ("legacy any() chain", legacy_intent),
+        ("IntentMatcher", matcher.match),
+    ]
+    for name, fn in runs:
+        best = min(timeit.repeat(lambda: [fn(m) for m in messages], number=1, repeat=5))
+        print(f"{name:<20} {best * 1e6 / len(messages):7.2f} us/msg  {len(messages) / best:12,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Sync (gunicorn-style workers) vs async (asgi_app) serving under mixed /chat traffic.
+
+Run from the repo root:  python benchmarks/bench_serving.py [clients] [requests_per_client]
+
+Traffic is 80% menu taps answered from memory and 20% "Track Order"
+lookups for unknown IDs, each of which reads the sheet (SHEET_LATENCY
+seconds, like a real Google Sheets round trip). The sync mode models the
+Procfile's default gunicorn sync workers: SYNC_WORKERS requests in flight,
+everything else queued. The async mode drives asgi_app in-process with
+its default thread pool and route limits. Both run in one process against
+the same IDecorBot, so the numbers compare scheduling, not HTTP parsing.
+
+Sample run (32 clients x 50 requests, 200 ms sheet, 2 sync workers, 16 async chat threads):
+
+    mode      req/s   menu p50/p95/p99 ms       track p50/p95/p99 ms
+    sync       49.2      616 /  1037 /  1235       815 /  1235 /  1260
+    async     363.9       15 /   172 /   258       214 /   351 /   380
+
+With 2 sync workers, any two slow lookups block every menu tap behind
+them. In async mode menu taps keep a low median, and the tail is bounded
+by the /chat thread pool (ASGI_CHAT_THREADS, default 16) that lookups share.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("ORDER_DB", os.path.join(tempfile.mkdtemp(), "orders.db"))
+# Load generators hammer /chat from one address; keep the rate limiter out of the measurement
+os.environ.setdefault("RATE_LIMIT_USER_PER_MIN", "100000000")
+os.environ.setdefault("RATE_LIMIT_IP_PER_MIN", "100000000")
+
+from fake_sheet import FakeWorksheet
+
+SHEET_LATENCY = 0.2
+SYNC_WORKERS = 2
+MENU_MESSAGES = ["hi", "policy", "📦 Track Order", "🛒 Place an order", "checkout", "anime posters"]
+
+
+def make_workload(clients, per_client, seed=7):
+    rng = random.Random(seed)
+    workload = []
+    for c in range(clients):
+        script = []
+        for i in range(per_client):
+            if rng.random() < 0.2:
+                # Back to the menu, into CHECK_STATUS, then an ID that misses the local store
+                script.append(("track", [("hi", "menu"), ("📦 Track Order", "menu"),
+                                         (f"ID{rng.randint(10**5, 10**6)}", "track")]))
+            else:
+                script.append(("menu", [(rng.choice(MENU_MESSAGES), "menu")]))
+        workload.append((f"bench_{c}", script))
+    return workload
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples: return (0, 0, 0)
+    pick = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)] * 1000
+    return pick(0.50), pick(0.95), pick(0.99)
+
+
+def run_sync(flask_app, workload):
+    """Each client submits its requests one by one to a pool of SYNC_WORKERS."""
+    pool = ThreadPoolExecutor(max_workers=SYNC_WORKERS)
+    latencies = {"menu": [], "track": []}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def post(user_id, message):
+        if not hasattr(local, "client"): local.client = flask_app.test_client()
+        return local.client.post("/chat", json={"message": message, "user_id": user_id}).status_code
+
+    def client(user_id, script):
+        for _, steps in script:
+            for message, kind in steps:
+                start = time.perf_counter()
+                pool.submit(post, user_id, message).result()
+                with lock: latencies[kind].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=c) for c in workload]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    pool.shutdown()
+    return time.perf_counter() - start, latencies
+
+
+def run_async(asgi, workload):
+    latencies = {"menu": [], "track": []}
+
+    async def post(user_id, message):
+        body = json.dumps({"message": message, "user_id": user_id}).encode()
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        scope = {"type": "http", "method": "POST", "path": "/chat", "query_string": b"",
+                 "headers": [(b"content-type", b"application/json")], "http_version": "1.1"}
+
+        async def receive():
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            pass
+        await asgi(scope, receive, send)
+
+    async def client(user_id, script):
+        for _, steps in script:
+            for message, kind in steps:
+                start = time.perf_counter()
+                await post(user_id, message)
+                latencies[kind].append(time.perf_counter() - start)
+
+    async def main():
+        await asyncio.gather(*(client(*c) for c in workload))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    import whatsapp_bot
+    import asgi_app
+    bot = whatsapp_bot.bot
+    bot.sheet_ready.wait(30)  # let the startup connect attempt finish before swapping in the fake
+    bot.sheet = FakeWorksheet(latency=SHEET_LATENCY)
+    bot.sheet_status = "ready"
+    bot.mirror.miss_refresh_interval = 0  # every unknown ID goes to the sheet
+
+    workload = make_workload(clients, per_client)
+    total = sum(len(steps) for _, script in workload for _, steps in script)
+    print(f"{clients} clients x {per_client} requests ({total} HTTP requests), "
+          f"sheet latency {SHEET_LATENCY * 1000:.0f} ms, {SYNC_WORKERS} sync workers, "
+          f"{asgi_app.CHAT_THREADS} async chat threads")
+    print(f"{'mode':<7}{'req/s':>8}   {'menu p50/p95/p99 ms':<26}{'track p50/p95/p99 ms':<26}")
+    for name, runner, target in [("sync", run_sync, whatsapp_bot.app), ("async", run_async, asgi_app.app)]:
+        elapsed, latencies = runner(target, workload)
+        menu = "%6.0f /%6.0f /%6.0f" % percentiles(latencies["menu"])
+        track = "%6.0f /%6.0f /%6.0f" % percentiles(latencies["track"])
+        print(f"{name:<7}{total / elapsed:8.1f}   {menu:<26}{track:<26}")
+
+
+if __name__ == "__main__":
+    main()
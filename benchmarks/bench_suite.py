@@ -0,0 +1,267 @@
+"""Benchmark suite on the in-memory fake sheet (benchmarks/fake_sheet.py).
+
+Run from the repo root:
+
+    python benchmarks/bench_suite.py                    # everything
+    python benchmarks/bench_suite.py --only lookups --sizes 1000,10000
+    python benchmarks/bench_suite.py --latency 0.15 --json results.json
+
+Sections:
+  conversations  full customer conversations through IDecorBot.handle_message
+  lookups        order status lookups (hits and misses) at 1k/10k/100k sheet rows
+  notifications  check_for_notifications: first full scan, idle ticks, ticks after staff verify rows
+  dispatch       a burst of verified orders drained through the outbox (queue-to-delivery latency)
+  chat           concurrent POST /chat through the Flask test client
+
+Each line reports count, throughput and p50/p95/p99 latency in ms. --json
+writes the same numbers so runs can be diffed for regressions. --latency
+adds a per-call delay to every fake sheet call, like a Google API round trip.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+TMP_DIR = tempfile.mkdtemp(prefix="bench_")
+os.environ.setdefault("ORDER_DB", os.path.join(TMP_DIR, "module_orders.db"))
+# Load generators hammer /chat from one address; keep the rate limiter out of the measurement
+os.environ.setdefault("RATE_LIMIT_USER_PER_MIN", "100000000")
+os.environ.setdefault("RATE_LIMIT_IP_PER_MIN", "100000000")
+
+from fake_sheet import FakeWorksheet, make_orders_sheet
+from notification_dispatcher import NotificationDispatcher, StubTransport
+
+# One customer: browse, order a catalog poster and a custom print, check out, track the order
+CONVERSATION = [
+    "hi", "anime posters", "policy", "🛒 Place an order", "Website Product", "Neon City Scape", "2",
+    "Yes", "Custom Product", "I have uploaded details", "1", "No, Checkout",
+    "Asha Rao", "12 MG Road, Pune", "98765 43210", "📦 Track Order", "__ORDER_ID__",
+]
+
+results = []
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples: return 0.0, 0.0, 0.0
+    pick = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)] * 1000
+    return pick(0.50), pick(0.95), pick(0.99)
+
+
+def report(name, samples, elapsed=None):
+    """Prints and records one result line; throughput is per wall second of the section if given."""
+    elapsed = elapsed if elapsed is not None else sum(samples)
+    p50, p95, p99 = percentiles(samples)
+    rate = len(samples) / elapsed if elapsed else 0.0
+    results.append({"name": name, "count": len(samples), "ops_per_sec": round(rate, 1),
+                    "p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3)})
+    print(f"{name:<48}{len(samples):>8}{rate:>12,.1f}{p50:>10.3f}{p95:>10.3f}{p99:>10.3f}")
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallows the bot's [SYSTEM] logging while timing."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def new_bot(name, sheet):
+    import whatsapp_bot
+    os.environ["ORDER_DB"] = os.path.join(TMP_DIR, f"{name}.db")
+    with quiet():
+        bot = whatsapp_bot.IDecorBot(connect=False)
+    bot.sheet = sheet
+    bot.sheet_status = "ready"
+    bot.dispatcher.transport = StubTransport(quiet=True)
+    return bot
+
+
+def drain(bot):
+    """Sends everything queued in the bot's outbox and marks it in the sheet."""
+    while bot.dispatcher.dispatch():
+        pass
+    while bot.dispatcher.confirm(bot.confirm_delivered):
+        pass
+
+
+def run_conversation(send, user_id, timings):
+    order_id = None
+    for message in CONVERSATION:
+        if message == "__ORDER_ID__": message = order_id or "ID0"
+        start = time.perf_counter()
+        reply = send(user_id, message)
+        timings.append(time.perf_counter() - start)
+        if "Order ID: #" in reply["text"]:
+            order_id = reply["text"].split("Order ID: #")[1].split("\n")[0]
+
+
+def bench_conversations(args):
+    bot = new_bot("conversations", FakeWorksheet(latency=args.latency))
+    timings = []
+    start = time.perf_counter()
+    with quiet():
+        for i in range(args.conversations):
+            run_conversation(bot.handle_message, f"conv_{i}", timings)
+    elapsed = time.perf_counter() - start
+    report(f"conversations: messages ({len(CONVERSATION)}/conv)", timings, elapsed)
+    results[-1]["conversations_per_sec"] = round(args.conversations / elapsed, 1)
+
+
+def bench_lookups(args):
+    rng = random.Random(1)
+    for size in args.sizes:
+        sheet = make_orders_sheet(size, verified_every=3, latency=args.latency)
+        bot = new_bot(f"lookups_{size}", sheet)
+        start = time.perf_counter()
+        with quiet():
+            bot.mirror.pull(sheet)
+        report(f"lookups {size:>6} rows: initial sheet sync", [time.perf_counter() - start])
+
+        hits, misses = [], []
+        with quiet():
+            for _ in range(args.lookups):
+                order_id = f"ID{rng.randrange(size)}"
+                start = time.perf_counter()
+                bot.get_order_status(order_id)
+                hits.append(time.perf_counter() - start)
+            for i in range(args.lookups // 10):
+                start = time.perf_counter()
+                bot.get_order_status(f"ID{size + i}")
+                misses.append(time.perf_counter() - start)
+        report(f"lookups {size:>6} rows: hit", hits)
+        report(f"lookups {size:>6} rows: miss", misses)
+
+
+def bench_notifications(args):
+    size = max(args.sizes)
+    # Old unverified orders are abandoned; only the recent tail is still awaiting payment
+    recent = min(size, 500)
+    sheet = make_orders_sheet(size, verified_every=50, confirmed=False, recent=recent, latency=args.latency)
+    bot = new_bot("notifications", sheet)
+
+    with quiet():
+        start = time.perf_counter()
+        queued = bot.check_for_notifications()
+        first = time.perf_counter() - start
+        drain(bot)
+    report(f"notifications {size} rows: first scan ({queued} queued)", [first])
+
+    idle = []
+    with quiet():
+        for _ in range(args.ticks):
+            start = time.perf_counter()
+            bot.check_for_notifications()
+            idle.append(time.perf_counter() - start)
+    report(f"notifications {size} rows: idle tick", idle)
+
+    busy = []
+    rng = random.Random(2)
+    with quiet():
+        for _ in range(args.ticks):
+            for _ in range(5):
+                sheet.staff_verify(rng.randrange(size + 2 - recent, size + 2))
+            start = time.perf_counter()
+            bot.check_for_notifications()
+            busy.append(time.perf_counter() - start)
+            drain(bot)
+    report(f"notifications {size} rows: tick after 5 verified", busy)
+
+
+def bench_dispatch(args):
+    for label, size, workers, batch_size in [
+        ("one at a time", min(args.burst, 200), 1, 1),
+        (f"{args.send_workers} workers x {args.send_batch}", args.burst, args.send_workers, args.send_batch),
+    ]:
+        sheet = make_orders_sheet(size, verified_every=1, confirmed=False, latency=args.latency)
+        bot = new_bot(f"dispatch_{workers}_{batch_size}", sheet)
+        bot.dispatcher = NotificationDispatcher(bot.outbox, StubTransport(latency=args.send_latency, quiet=True),
+                                                workers=workers, batch_size=batch_size)
+
+        start = time.perf_counter()
+        with quiet():
+            bot.check_for_notifications()
+            drain(bot)
+        elapsed = time.perf_counter() - start
+        delays = [sent - created for created, sent in bot.outbox._conn().execute(
+            "SELECT created, sent_at FROM outbox WHERE status = 'sent' AND confirmed = 1")]
+        report(f"dispatch burst {size}: {label}", delays, elapsed)
+        results[-1]["sheet_calls"] = sum(sheet.calls.values())
+
+
+def bench_chat(args):
+    import whatsapp_bot
+    bot = whatsapp_bot.bot
+    bot.sheet_ready.wait(30)  # let the startup connect attempt finish before swapping in the fake
+    bot.sheet = FakeWorksheet(latency=args.latency)
+    bot.sheet_status = "ready"
+
+    timings = []
+    lock = threading.Lock()
+
+    def client(n):
+        http = whatsapp_bot.app.test_client()
+        local = []
+
+        def send(user_id, message):
+            return http.post("/chat", json={"message": message, "user_id": user_id}).get_json()["response"]
+        for i in range(args.conversations // args.threads or 1):
+            run_conversation(send, f"chat_{n}_{i}", local)
+        with lock: timings.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.threads)]
+    start = time.perf_counter()
+    with quiet():
+        for t in threads: t.start()
+        for t in threads: t.join()
+    report(f"/chat x{args.threads} threads: requests", timings, time.perf_counter() - start)
+
+
+SECTIONS = {
+    "conversations": bench_conversations,
+    "lookups": bench_lookups,
+    "notifications": bench_notifications,
+    "dispatch": bench_dispatch,
+    "chat": bench_chat,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--only", choices=sorted(SECTIONS), action="append", help="run only these sections")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="sheet sizes for lookups/notifications")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake sheet call")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=2000, help="verified orders in the dispatch burst")
+    parser.add_argument("--send-latency", type=float, default=0.05, help="seconds per stub transport batch call")
+    parser.add_argument("--send-workers", type=int, default=4)
+    parser.add_argument("--send-batch", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",")]
+
+    with quiet():
+        import whatsapp_bot  # module import starts the app's own bot and threads
+
+    print(f"{'benchmark':<48}{'count':>8}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in args.only or SECTIONS:
+        SECTIONS[name](args)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency": args.latency, "results": results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""In-memory stand-in for a gspread Worksheet, for benchmarks and load tests.
+
+Implements the calls the bot makes (get_all_records, get_all_values,
+get_values, col_values, row_values, batch_get, append_rows, append_row,
+update_cell, batch_update, spreadsheet.get_lastUpdateTime) with optional
+per-call latency and Google-style 429 quota errors, so code paths can be
+timed without touching the live API.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol
+
+# Column headers of the production order sheet (the order save_order_batch writes them in)
+ORDER_HEADERS = ["Order ID", "Customer Name", "Product Name", "Product Type", "Size", "Quantity",
+                 "Order Date", "address", "Contact no.", "another contact no.",
+                 "Payment Verified", "Confirmation Sent"]
+
+
+def quota_error():
+    """The APIError gspread raises on 429 RESOURCE_EXHAUSTED."""
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps({"error": {
+        "code": 429, "status": "RESOURCE_EXHAUSTED",
+        "message": "Quota exceeded for quota metric 'Read requests' (fake sheet)",
+    }}).encode()
+    return APIError(response)
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def get_lastUpdateTime(self):
+        self.worksheet._call("get_lastUpdateTime")
+        return self.worksheet.updated_at
+
+
+class FakeWorksheet:
+    """A worksheet held as a list of string rows (row 1 = headers).
+
+    latency:          seconds slept per API call (plus up to `jitter` more)
+    quota_per_minute: calls allowed in any 60 s window; beyond it calls raise quota_error()
+    error_rate:       probability that any call raises quota_error()
+    """
+
+    title = "fake"
+
+    def __init__(self, rows=None, latency=0.0, jitter=0.0, quota_per_minute=None, error_rate=0.0, seed=None):
+        self.rows = [[str(c) for c in r] for r in (rows or [ORDER_HEADERS])]
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent_calls = deque()
+        self.calls = Counter()
+        self.errors = 0
+        self.updated_at = self._now()
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc).isoformat()
+
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+            now = time.monotonic()
+            fail = self.error_rate and self.random.random() < self.error_rate
+            if self.quota_per_minute is not None:
+                while self.recent_calls and now - self.recent_calls[0] > 60:
+                    self.recent_calls.popleft()
+                if len(self.recent_calls) >= self.quota_per_minute:
+                    fail = True
+                else:
+                    self.recent_calls.append(now)
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay: time.sleep(delay)
+        if fail:
+            self.errors += 1
+            raise quota_error()
+
+    def _touch(self):
+        self.updated_at = self._now()
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    # --- Reads ---
+
+    def get_all_values(self, **kwargs):
+        self._call("get_all_values")
+        with self.lock:
+            return [list(r) for r in self.rows]
+
+    def get_all_records(self, **kwargs):
+        self._call("get_all_records")
+        with self.lock:
+            headers = self.rows[0]
+            return [dict(zip(headers, r + [""] * (len(headers) - len(r)))) for r in self.rows[1:]]
+
+    def get_values(self, range_name=None, **kwargs):
+        self._call("get_values")
+        return self._read_range(range_name)
+
+    def batch_get(self, ranges, **kwargs):
+        self._call("batch_get")
+        return [self._read_range(r) for r in ranges]
+
+    def col_values(self, col, **kwargs):
+        self._call("col_values")
+        with self.lock:
+            values = [r[col - 1] if len(r) >= col else "" for r in self.rows]
+        while values and values[-1] == "": values.pop()
+        return values
+
+    def row_values(self, row, **kwargs):
+        self._call("row_values")
+        with self.lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def _read_range(self, range_name):
+        """A1 ranges like 'A5:L', 'A5:L9' or 'L5:L9'; trailing empty rows are dropped like the API does."""
+        if range_name is None:
+            first, last = "A1", None
+        else:
+            first, _, last = range_name.partition(":")
+        r1, c1 = a1_to_rowcol(first)
+        if last:
+            letters = last.rstrip("0123456789")
+            digits = last[len(letters):]
+            c2 = a1_to_rowcol(letters + "1")[1]
+            r2 = int(digits) if digits else None
+        else:
+            c2, r2 = None, r1
+        with self.lock:
+            out = [r[c1 - 1:c2] for r in self.rows[r1 - 1:r2]]
+        while out and not any(out[-1]): out.pop()
+        return out
+
+    # --- Writes ---
+
+    def append_rows(self, values, **kwargs):
+        self._call("append_rows")
+        with self.lock:
+            self.rows.extend([str(c) for c in r] for r in values)
+            self._touch()
+
+    def append_row(self, values, **kwargs):
+        self._call("append_row")
+        with self.lock:
+            self.rows.append([str(c) for c in values])
+            self._touch()
+
+    def update_cell(self, row, col, value):
+        self._call("update_cell")
+        with self.lock:
+            self._set(row, col, value)
+            self._touch()
+
+    def batch_update(self, data, **kwargs):
+        self._call("batch_update")
+        with self.lock:
+            for update in data:
+                row, col = a1_to_rowcol(update["range"].split(":")[0])
+                for i, values in enumerate(update["values"]):
+                    for j, value in enumerate(values):
+                        self._set(row + i, col + j, value)
+            self._touch()
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row: self.rows.append([])
+        cells = self.rows[row - 1]
+        if len(cells) < col: cells.extend([""] * (col - len(cells)))
+        cells[col - 1] = str(value)
+
+    # --- Staff edits (no latency, no quota: these happen in the browser) ---
+
+    def staff_verify(self, row):
+        """Marks a sheet row Payment Verified = Yes, as staff would by hand."""
+        with self.lock:
+            self._set(row, ORDER_HEADERS.index("Payment Verified") + 1, "Yes")
+            self._touch()
+
+
+def order_row(order_id, order_date="2025-01-01 10:00:00", verified="No", confirmed="No", phone="9876543210"):
+    """One order line in ORDER_HEADERS layout."""
+    return [order_id, "Customer", "Neon City Scape", "Website", "NA", "1", order_date,
+            "12 Road", phone, "", verified, confirmed]
+
+
+def make_orders_sheet(n, verified_every=0, confirmed=True, recent=0, **kwargs):
+    """A sheet with n order rows (IDs ID0..ID{n-1}).
+
+    Every `verified_every`-th row is Payment Verified; with confirmed=False
+    those rows still await their confirmation message. The last `recent`
+    rows are dated now, the rest 2025-01-01.
+    """
+    rows = [ORDER_HEADERS]
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    for i in range(n):
+        verified = bool(verified_every) and i % verified_every == 0
+        rows.append(order_row(f"ID{i}", now if i >= n - recent else "2025-01-01 10:00:00",
+                              "Yes" if verified else "No", "Yes" if verified and confirmed else "No",
+                              phone="98765%05d" % (i % 100000)))
+    return FakeWorksheet(rows, **kwargs)
@@ -0,0 +1,166 @@
+import bisect
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class CatalogIndex:
+    """Immutable snapshot of products.json plus its lookup indexes."""
+
+    def __init__(self, products):
+        self.products = [p for p in products if isinstance(p, dict) and p.get('name')]
+        self.by_id = {}
+        self.by_name = {}
+        self.by_category = defaultdict(list)
+        self.by_tag = defaultdict(list)
+        token_pairs = set()
+
+        for pos, p in enumerate(self.products):
+            self.by_id[str(p.get('id', pos))] = pos
+            self.by_name.setdefault(p['name'].strip().lower(), pos)
+            if p.get('category'):
+                self.by_category[str(p['category']).lower()].append(pos)
+            for tag in p.get('tags', []) or []:
+                self.by_tag[str(tag).lower()].append(pos)
+            for token in tokenize(p['name']):
+                token_pairs.add((token, pos))
+
+        # Sorted (token, position) pairs: a prefix query is one bisect plus a short walk
+        self.tokens = sorted(token_pairs)
+        self.token_keys = [t for t, _ in self.tokens]
+        # Fuzzy candidates are bucketed by first letter to keep difflib's scan small
+        self.vocab = defaultdict(set)
+        for token in self.token_keys:
+            self.vocab[token[0]].add(token)
+
+    def prefix_positions(self, prefix):
+        out = []
+        i = bisect.bisect_left(self.token_keys, prefix)
+        while i < len(self.tokens) and self.token_keys[i].startswith(prefix):
+            out.append(self.tokens[i][1])
+            i += 1
+        return out
+
+
+class Catalog:
+    """Product catalog over products.json with ID/name/category/tag indexes,
+    prefix + fuzzy search and cursor pagination.
+
+    The file's mtime is checked at most every `reload_interval` seconds; on a
+    change the indexes are rebuilt and swapped in, so edits to products.json
+    go live without restarting workers.
+    """
+
+    def __init__(self, path, reload_interval=10):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.index = CatalogIndex([])
+        self.mtime = None
+        self.last_check = 0
+        self.reload()
+
+    def reload(self):
+        mtime = None
+        try:
+            mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+            products = []
+            if mtime is not None:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    products = json.load(f)
+            self.index = CatalogIndex(products)
+            self.mtime = mtime
+            print(f"[SYSTEM]: Catalog loaded with {len(self.index.products)} products.")
+        except Exception as e:
+            # Keep serving the previous snapshot
+            print(f"Error loading products: {e}")
+            self.mtime = mtime
+        self.last_check = time.time()
+
+    def _current(self):
+        if time.time() - self.last_check > self.reload_interval:
+            with self.lock:
+                if time.time() - self.last_check > self.reload_interval:
+                    self.last_check = time.time()
+                    mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+                    if mtime != self.mtime:
+                        self.reload()
+        return self.index
+
+    @property
+    def products(self):
+        return self._current().products
+
+    def get(self, product_id):
+        idx = self._current()
+        pos = idx.by_id.get(str(product_id))
+        return idx.products[pos] if pos is not None else None
+
+    def find_by_name(self, name):
+        idx = self._current()
+        pos = idx.by_name.get(str(name).strip().lower())
+        return idx.products[pos] if pos is not None else None
+
+    def page(self, cursor=None, limit=10, category=None, tag=None):
+        """Returns (products, next_cursor); next_cursor is None on the last page."""
+        idx = self._current()
+        if category:
+            positions = idx.by_category.get(str(category).lower(), [])
+        elif tag:
+            positions = idx.by_tag.get(str(tag).lower(), [])
+        else:
+            positions = range(len(idx.products))
+        try:
+            start = max(int(cursor or 0), 0)
+        except ValueError:
+            start = 0
+        end = start + limit
+        items = [idx.products[pos] for pos in positions[start:end]]
+        return items, (str(end) if end < len(positions) else None)
+
+    def search(self, query, limit=10):
+        """Name search: exact, then every query word as a word prefix, then fuzzy word matches."""
+        idx = self._current()
+        query = str(query).strip().lower()
+        words = tokenize(query)
+        if not words: return []
+
+        exact = idx.by_name.get(query)
+        ranked = [exact] if exact is not None else []
+
+        # All query words must prefix-match some word of the name ("neon sc" -> Neon City Scape)
+        hits = None
+        for word in words:
+            found = set(idx.prefix_positions(word))
+            hits = found if hits is None else hits & found
+            if not hits: break
+        if hits:
+            ranked.extend(sorted(hits))
+
+        if len(ranked) < limit:
+            # Typos: words close to a catalog word ("neom" -> "neon")
+            fuzzy = []
+            for word in words:
+                close = difflib.get_close_matches(word, idx.vocab.get(word[0], ()), n=5, cutoff=0.75)
+                for token in close:
+                    fuzzy.extend(idx.prefix_positions(token))
+            ranked.extend(sorted(set(fuzzy)))
+
+        seen = set()
+        out = []
+        for pos in ranked:
+            if pos in seen: continue
+            seen.add(pos)
+            out.append(idx.products[pos])
+            if len(out) >= limit: break
+        return out
@@ -15,11 +15,28 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // --- LOCAL BOT ENGINE (Offline Fallback) ---
+    // Keyword rules come from intents.json (same file the Python bot uses), inlined into the page by the / route.
+    // The last copy seen is kept in localStorage so the offline engine still has it if the page comes without one.
+    let pageIntents = null;
+    try { pageIntents = JSON.parse(document.getElementById('chat-intents').textContent); } catch (e) { }
+    let cachedIntents = null;
+    try { cachedIntents = JSON.parse(localStorage.getItem('chat_intents')); } catch (e) { }
+    if (pageIntents) localStorage.setItem('chat_intents', JSON.stringify(pageIntents));
+
     const LocalBot = {
         state: "IDLE",
         cart: [],
         userInfo: {},
         fallbackCount: 0,
+        intents: pageIntents || cachedIntents || { resets: ["hi", "hello", "hey", "menu", "start", "restart", "main menu", "🔙 main menu"], intents: [] },
+
+        // Earlier intents win, matching IntentMatcher in intent_matcher.py
+        matchIntent: function (lowerMsg) {
+            for (const intent of this.intents.intents) {
+                if (intent.keywords.some(kw => lowerMsg.includes(kw))) return intent.name;
+            }
+            return null;
+        },
 
         // Constants (Mirrored from Python)
         WELCOME_MESSAGE: {
@@ -42,7 +59,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const lowerMsg = msg.toLowerCase().trim();
 
             // 1. Global Resets
-            if (["hi", "hello", "hey", "menu", "start", "restart", "main menu", "🔙 main menu"].includes(lowerMsg)) {
+            if (this.intents.resets.includes(lowerMsg)) {
                 this.state = "IDLE";
                 this.fallbackCount = 0;
                 return this.WELCOME_MESSAGE;
@@ -50,14 +67,16 @@ document.addEventListener('DOMContentLoaded', () => {
 
             // 2. IDLE State Rules
             if (this.state === "IDLE") {
+                const intent = this.matchIntent(lowerMsg);
+
                 // Rule #1: Tracking
-                if (lowerMsg.match(/track|status|where is my order/)) {
+                if (intent === "track_order") {
                     this.state = "CHECK_STATUS";
                     return { text: "Sure! Please enter your **Order ID** (e.g., 1234) to check status.", options: ["🔙 Main Menu"] };
                 }
 
                 // Rule #2: Products
-                if (lowerMsg.match(/anime|marvel|cars|gift|collection/)) {
+                if (intent === "collection") {
                     let cat = "all";
                     if (lowerMsg.includes("anime")) cat = "anime";
                     else if (lowerMsg.includes("marvel")) cat = "marvel";
@@ -70,7 +89,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
 
                 // Rule #3: Custom
-                if (lowerMsg.match(/custom|personal|my own photo|print|image uploaded/)) {
+                if (intent === "custom_print") {
                     if (lowerMsg.includes("image uploaded")) {
                         this.state = "CUSTOM_ASK_QTY";
                         return { text: "Wow, great shot! 📸 I've received your image. How many copies do you need?", options: ["1", "2", "3", "5"] };
@@ -82,13 +101,13 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
 
                 // Rule #4: Policies
-                if (lowerMsg.match(/return|broken|refund|shipping|policy/)) return this.POLICIES_MESSAGE;
+                if (intent === "policies") return this.POLICIES_MESSAGE;
 
                 // Cart
-                if (lowerMsg.match(/checkout|buy|cart/)) return { text: "Ready to own your art? 🛒\n\n<a href='#' style='color:gold;font-weight:bold;'>Proceed to Checkout</a>", options: ["🔙 Main Menu"] };
+                if (intent === "checkout") return { text: "Ready to own your art? 🛒\n\n<a href='#' style='color:gold;font-weight:bold;'>Proceed to Checkout</a>", options: ["🔙 Main Menu"] };
 
                 // Place Order flow initiator
-                if (lowerMsg.includes("place an order")) {
+                if (intent === "place_order") {
                     this.state = "ASK_ORDER_CATEGORY";
                     return { text: "What would you like to order?", options: ["Website Product", "Custom Product"] };
                 }
@@ -167,6 +186,16 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    if (!pageIntents) {
+        fetch('/intents.json')
+            .then(response => response.json())
+            .then(data => {
+                LocalBot.intents = data;
+                localStorage.setItem('chat_intents', JSON.stringify(data));
+            })
+            .catch(err => console.log('Could not load intents.json, using the cached copy:', err));
+    }
+
     // Bot Response Logic (Hybrid: Server -> Local Fallback)
     const handleBotResponse = (userMsg) => {
         // Try Backend First
@@ -176,7 +205,8 @@ document.addEventListener('DOMContentLoaded', () => {
             body: JSON.stringify({ message: userMsg, user_id: userId }),
         })
             .then(response => {
-                if (!response.ok) throw new Error("Server Offline");
+                // 429 (rate limited) still carries a normal bot reply; other errors mean the server is down
+                if (!response.ok && response.status !== 429) throw new Error("Server Offline");
                 return response.json();
             })
             .then(data => {
@@ -314,14 +344,14 @@ document.addEventListener('DOMContentLoaded', () => {
                         // Send URL as message to bot
                         const msgDiv = document.createElement('div');
                         msgDiv.className = 'message user';
-                        msgDiv.innerHTML = `<div class="bubble"><img src="${data.url}" style="max-width: 200px; border-radius: 10px;"></div><span class="timestamp">Just now</span>`;
+                        msgDiv.innerHTML = `<div class="bubble"><img src="${data.preview || data.url}" style="max-width: 200px; border-radius: 10px;"></div><span class="timestamp">Just now</span>`;
                         chatMessages.appendChild(msgDiv);
                         scrollToBottom();
 
                         // Send to backend
                         handleBotResponse(`[Image Uploaded] ${data.url}`);
                     } else {
-                        appendMessage('bot', '❌ Upload failed.');
+                        appendMessage('bot', data.error ? `❌ Upload failed: ${data.error}` : '❌ Upload failed.');
                     }
                 })
                 .catch(err => {
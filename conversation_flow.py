@@ -0,0 +1,49 @@
+# Conversation transition table: state -> states its handler may move the session to.
+# Global resets ("hi", "menu", ...) can jump to IDLE from anywhere and are not listed.
+FLOW = {
+    "IDLE": frozenset(["IDLE", "CHECK_STATUS", "CUSTOM_ASK_QTY", "ASK_ORDER_CATEGORY"]),
+    "CHECK_STATUS": frozenset(["IDLE", "CHECK_STATUS"]),
+    "ASK_ORDER_CATEGORY": frozenset(["ASK_ORDER_CATEGORY", "WEBSITE_SELECT_PRODUCT", "CUSTOM_UPLOAD_DETAILS"]),
+    "WEBSITE_SELECT_PRODUCT": frozenset(["IDLE", "WEBSITE_SELECT_PRODUCT", "WEBSITE_ASK_QTY"]),
+    "WEBSITE_ASK_QTY": frozenset(["ASK_ADD_MORE"]),
+    "CUSTOM_UPLOAD_DETAILS": frozenset(["CUSTOM_ASK_QTY"]),
+    "CUSTOM_ASK_QTY": frozenset(["ASK_ADD_MORE"]),
+    "ASK_ADD_MORE": frozenset(["ASK_ORDER_CATEGORY", "ASK_NAME"]),
+    "ASK_NAME": frozenset(["ASK_ADDRESS"]),
+    "ASK_ADDRESS": frozenset(["ASK_PHONE"]),
+    "ASK_PHONE": frozenset(["ASK_PHONE", "IDLE"]),
+}
+
+
+def _reachable(flow, start):
+    seen = {start}
+    stack = [start]
+    while stack:
+        for nxt in flow.get(stack.pop(), ()):
+            if nxt not in seen:
+                seen.add(nxt)
+                stack.append(nxt)
+    return seen
+
+
+def validate_flow(flow, handlers, start="IDLE"):
+    """Raises ValueError if the table and handlers disagree, or a state is unreachable or a dead end.
+
+    A dead end is a state from which the conversation can never get back to
+    `start` without the user typing a global reset.
+    """
+    problems = []
+    for state in flow:
+        if state not in handlers: problems.append(f"{state} has no handler")
+        for nxt in flow[state]:
+            if nxt not in flow: problems.append(f"{state} -> {nxt}: unknown state")
+    for state in handlers:
+        if state not in flow: problems.append(f"handler for {state} is not in the flow table")
+
+    reachable = _reachable(flow, start)
+    for state in flow:
+        if state not in reachable: problems.append(f"{state} is unreachable from {start}")
+        elif start not in _reachable(flow, state): problems.append(f"{state} is a dead end")
+
+    if problems:
+        raise ValueError("Invalid conversation flow: " + "; ".join(problems))
@@ -0,0 +1,30 @@
+import json
+
+
+class IntentMatcher:
+    """Matches a message against the keyword rules in intents.json.
+
+    Rules keep the old substring semantics ("track" matches "tracking") and
+    their priority: intents are checked in file order and the first one with
+    a keyword in the message wins. With a few dozen short keywords, plain
+    `in` checks on the lowercased message beat a combined regex, and need
+    no per-message cache for free text to fill.
+    """
+
+    def __init__(self, intents, resets=()):
+        self.resets = frozenset(resets)
+        self.rules = [(intent["name"], tuple(kw.lower() for kw in intent["keywords"])) for intent in intents]
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["intents"], data.get("resets", ()))
+
+    def match(self, msg_lower):
+        """Returns (intent_name, matched_keywords) for the winning intent, or (None, frozenset())."""
+        for name, keywords in self.rules:
+            for kw in keywords:
+                if kw in msg_lower:
+                    return name, frozenset(k for k in keywords if k in msg_lower)
+        return None, frozenset()
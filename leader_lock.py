@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows (start_server.bat)
+    fcntl = None
+    import msvcrt
+
+
+class LeaderLock:
+    """Non-blocking exclusive file lock used to elect one leader per host.
+
+    The OS drops the lock when the holding process exits or crashes, so a
+    waiting worker takes over on its next acquire() attempt.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get(
+            "MONITOR_LOCK_FILE", os.path.join(tempfile.gettempdir(), "posterman_monitor.lock")
+        )
+        self.fd = None
+
+    @property
+    def is_leader(self):
+        return self.fd is not None
+
+    def acquire(self):
+        if self.fd is not None: return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+
+        # Record the holder for anyone debugging from the shell
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is None: return
+        try:
+            if fcntl:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self.fd)
+            self.fd = None
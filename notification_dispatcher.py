@@ -0,0 +1,183 @@
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+class Transport(ABC):
+    """Delivers customer messages.
+
+    send_batch() gets [(order_id, phone, text), ...] and returns
+    {order_id: None on success, or the error}. The default sends one at a
+    time through send(); transports with a bulk API override send_batch.
+    """
+
+    def send_batch(self, batch):
+        results = {}
+        for order_id, phone, text in batch:
+            try:
+                self.send(order_id, phone, text)
+                results[order_id] = None
+            except Exception as e:
+                results[order_id] = e
+        return results
+
+    @abstractmethod
+    def send(self, order_id, phone, text):
+        """Delivers one message; raises on failure."""
+
+
+class StubTransport(Transport):
+    """Local/testing transport: logs messages and keeps them in `sent`.
+
+    latency is slept once per batch (like one API round trip); fail_rate
+    makes that share of messages fail, to exercise retries.
+    """
+
+    def __init__(self, latency=0.0, fail_rate=0.0, quiet=False):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.quiet = quiet
+        self.lock = threading.Lock()
+        self.sent = []
+
+    def send_batch(self, batch):
+        if self.latency: time.sleep(self.latency)
+        results = {}
+        for order_id, phone, text in batch:
+            if self.fail_rate and random.random() < self.fail_rate:
+                results[order_id] = RuntimeError("stub transport: simulated failure")
+                continue
+            with self.lock:
+                self.sent.append((order_id, phone, text))
+            if not self.quiet:
+                print(f"[NOTIFY]: (stub) to {phone}: {text}")
+            results[order_id] = None
+        return results
+
+    def send(self, order_id, phone, text):
+        error = self.send_batch([(order_id, phone, text)])[order_id]
+        if error: raise error
+
+
+class WebhookTransport(Transport):
+    """POSTs each batch as JSON to a messaging gateway:
+
+        {"messages": [{"idempotency_key": order_id, "phone": ..., "text": ...}, ...]}
+
+    A 2xx response means the whole batch was accepted, except order IDs
+    listed in an optional {"failed": {order_id: reason}} body. The gateway
+    should drop repeated idempotency keys, since retries are at-least-once.
+    """
+
+    def __init__(self, url, token=None, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token: self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def send_batch(self, batch):
+        payload = {"messages": [{"idempotency_key": o, "phone": p, "text": t} for o, p, t in batch]}
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        try:
+            failed = (response.json() or {}).get("failed", {})
+        except ValueError:
+            failed = {}
+        return {o: (RuntimeError(failed[o]) if o in failed else None) for o, _, _ in batch}
+
+    def send(self, order_id, phone, text):
+        error = self.send_batch([(order_id, phone, text)])[order_id]
+        if error: raise error
+
+
+def create_transport():
+    """Picks the transport from NOTIFY_TRANSPORT: 'webhook' (needs NOTIFY_WEBHOOK_URL) or 'stub' (local testing).
+
+    Returns None when it is unset or unknown: messages then stay queued, and
+    no row is marked 'Confirmation Sent', until a real transport is configured.
+    """
+    kind = os.environ.get("NOTIFY_TRANSPORT", "").strip().lower()
+    if kind == "webhook":
+        return WebhookTransport(os.environ["NOTIFY_WEBHOOK_URL"], os.environ.get("NOTIFY_WEBHOOK_TOKEN"))
+    if kind == "stub":
+        print("[SYSTEM]: NOTIFY_TRANSPORT=stub: confirmation messages are only logged, not sent to customers.")
+        return StubTransport()
+    if kind:
+        print(f"[ERROR]: Unknown NOTIFY_TRANSPORT '{kind}'; confirmation messages will stay queued.")
+    else:
+        print("[SYSTEM]: NOTIFY_TRANSPORT not set; confirmation messages will stay queued.")
+    return None
+
+
+class NotificationDispatcher:
+    """Drains the outbox in concurrent batches.
+
+    dispatch() claims up to workers * batch_size due messages, sends them
+    as `workers` parallel send_batch calls and records each result;
+    failures are retried with jittered exponential backoff. confirm() then
+    writes 'Confirmation Sent' for everything delivered, in one sheet call
+    per round, so a burst of verifications costs a handful of API calls
+    rather than one per row.
+    """
+
+    def __init__(self, outbox, transport, workers=4, batch_size=50, retry_base=30, max_backoff=3600):
+        self.outbox = outbox
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notify")
+        self.wakeup = threading.Event()
+        self.stats = {"sent": 0, "failed": 0, "confirmed": 0}
+
+    def dispatch(self):
+        """One round; returns the number of messages delivered."""
+        if self.transport is None: return 0
+        claimed = self.outbox.claim(self.workers * self.batch_size)
+        if not claimed: return 0
+        attempts = {order_id: attempt for order_id, _, _, attempt in claimed}
+        batches = [
+            [(order_id, phone, text) for order_id, phone, text, _ in claimed[i:i + self.batch_size]]
+            for i in range(0, len(claimed), self.batch_size)
+        ]
+
+        delivered, failures = [], []
+        for batch, results in zip(batches, self.pool.map(self._send, batches)):
+            for order_id, _, _ in batch:
+                error = results.get(order_id, RuntimeError("no result from transport"))
+                if error is None:
+                    delivered.append(order_id)
+                else:
+                    attempt = attempts[order_id]
+                    delay = min(self.max_backoff, self.retry_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                    failures.append((order_id, error, attempt, time.time() + delay))
+
+        self.outbox.mark_sent(delivered)
+        self.outbox.mark_failed(failures)
+        self.stats["sent"] += len(delivered)
+        self.stats["failed"] += len(failures)
+        if failures:
+            print(f"[ERROR]: {len(failures)} notifications failed (e.g. {failures[0][0]}: {failures[0][1]}); will retry.")
+        return len(delivered)
+
+    def _send(self, batch):
+        try:
+            return self.transport.send_batch(batch)
+        except Exception as e:
+            return {order_id: e for order_id, _, _ in batch}
+
+    def confirm(self, confirm_rows):
+        """Marks delivered orders in the sheet via confirm_rows([(order_id, [sheet_row, ...])]),
+        which returns the order IDs it handled. Returns how many were confirmed."""
+        pending = self.outbox.claim_unconfirmed()
+        if not pending: return 0
+        done = set(confirm_rows(pending))
+        self.outbox.mark_confirmed([(order_id, rows) for order_id, rows in pending if order_id in done])
+        self.stats["confirmed"] += len(done)
+        return len(done)
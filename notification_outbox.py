@@ -0,0 +1,168 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class SQLiteOutbox:
+    """Durable queue of customer notifications, one row per order ID.
+
+    The order ID is the idempotency key: finding the same verified order
+    again (next tick, another worker, after a restart) never queues a
+    second message. Its sheet rows are merged instead, so late-verified
+    lines of a multi-item order still get 'Confirmation Sent'.
+
+    Lifecycle: pending -> sent (delivered) -> confirmed=1 once the sheet is
+    marked. Failed sends go back to pending with a later next_attempt, or to
+    'failed' after max_attempts. Claims are leased like order lines, so a
+    worker that dies mid-send leaves its batch to be retried (at-least-once).
+    """
+
+    def __init__(self, path, lease=120, max_attempts=8):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "order_id TEXT PRIMARY KEY, phone TEXT NOT NULL, message TEXT NOT NULL, "
+            "sheet_rows TEXT NOT NULL DEFAULT '[]', status TEXT NOT NULL DEFAULT 'pending', "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL DEFAULT 0, "
+            "claimed_until REAL NOT NULL DEFAULT 0, last_error TEXT, confirmed INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, sent_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt)")
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def enqueue(self, items):
+        """items = [(order_id, phone, message, sheet_rows)]. Returns how many orders were newly queued."""
+        conn = self._conn()
+        now = time.time()
+        queued = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for order_id, phone, message, sheet_rows in items:
+                existing = conn.execute("SELECT sheet_rows FROM outbox WHERE order_id = ?", (order_id,)).fetchone()
+                if existing is None:
+                    conn.execute(
+                        "INSERT INTO outbox (order_id, phone, message, sheet_rows, created) VALUES (?, ?, ?, ?, ?)",
+                        (order_id, phone, message, json.dumps(sorted(set(sheet_rows))), now),
+                    )
+                    queued += 1
+                    continue
+                known = set(json.loads(existing[0]))
+                if not set(sheet_rows) <= known:
+                    # Already queued or sent: only the new rows need marking
+                    conn.execute(
+                        "UPDATE outbox SET sheet_rows = ?, confirmed = 0 WHERE order_id = ?",
+                        (json.dumps(sorted(known | set(sheet_rows))), order_id),
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return queued
+
+    def claim(self, limit):
+        """Leases up to `limit` due messages; returns [(order_id, phone, message, attempt)] oldest first."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            found = conn.execute(
+                "SELECT order_id, phone, message, attempts FROM outbox "
+                "WHERE status = 'pending' AND next_attempt <= ? AND claimed_until < ? ORDER BY created LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            if found:
+                conn.executemany(
+                    "UPDATE outbox SET claimed_until = ?, attempts = attempts + 1 WHERE order_id = ?",
+                    [(now + self.lease, order_id) for order_id, _, _, _ in found],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(order_id, phone, message, attempts + 1) for order_id, phone, message, attempts in found]
+
+    def mark_sent(self, order_ids):
+        now = time.time()
+        self._conn().executemany(
+            "UPDATE outbox SET status = 'sent', sent_at = ?, claimed_until = 0, last_error = NULL WHERE order_id = ?",
+            [(now, order_id) for order_id in order_ids],
+        )
+
+    def mark_failed(self, failures):
+        """failures = [(order_id, error, attempt, retry_at)]; gives up after max_attempts."""
+        self._conn().executemany(
+            "UPDATE outbox SET status = ?, next_attempt = ?, claimed_until = 0, last_error = ? WHERE order_id = ?",
+            [
+                ('failed' if attempt >= self.max_attempts else 'pending', retry_at, str(error), order_id)
+                for order_id, error, attempt, retry_at in failures
+            ],
+        )
+
+    def retry_failed(self):
+        """Puts every 'failed' message back in the queue with a fresh attempt budget. Returns how many."""
+        return self._conn().execute(
+            "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt = 0, claimed_until = 0 "
+            "WHERE status = 'failed'"
+        ).rowcount
+
+    def claim_unconfirmed(self, limit=500):
+        """Leases up to `limit` delivered orders whose sheet rows are not marked yet: [(order_id, [sheet_row, ...])]."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            found = conn.execute(
+                "SELECT order_id, sheet_rows FROM outbox "
+                "WHERE status = 'sent' AND confirmed = 0 AND claimed_until < ? LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            if found:
+                conn.executemany(
+                    "UPDATE outbox SET claimed_until = ? WHERE order_id = ?",
+                    [(now + self.lease, order_id) for order_id, _ in found],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(order_id, json.loads(rows)) for order_id, rows in found]
+
+    def mark_confirmed(self, confirmed):
+        """confirmed = [(order_id, [sheet_row, ...])] as claimed. Rows merged in since the claim stay unconfirmed."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for order_id, sheet_rows in confirmed:
+                current = conn.execute("SELECT sheet_rows FROM outbox WHERE order_id = ?", (order_id,)).fetchone()
+                if current is None: continue
+                # Row numbers are dropped once used; if one was stale the scanner finds the row again and re-merges it
+                remaining = sorted(set(json.loads(current[0])) - set(sheet_rows))
+                conn.execute(
+                    "UPDATE outbox SET confirmed = ?, sheet_rows = ?, claimed_until = 0 WHERE order_id = ?",
+                    (int(not remaining), json.dumps(remaining), order_id),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count(self, status, confirmed=None):
+        sql = "SELECT COUNT(*) FROM outbox WHERE status = ?"
+        args = [status]
+        if confirmed is not None:
+            sql += " AND confirmed = ?"
+            args.append(int(confirmed))
+        return self._conn().execute(sql, args).fetchone()[0]
@@ -0,0 +1,160 @@
+import time
+
+from gspread.utils import rowcol_to_a1
+
+from order_ids import order_created
+from sheet_columns import CONF_SENT_COLS, ORDER_DATE_COLS, ORDER_ID_COLS, VERIFIED_COLS, find_col
+
+
+def coalesce_rows(sheet_rows, first_col, last_col):
+    """Turns sorted sheet row numbers into A1 ranges, one per run of consecutive rows."""
+    ranges = []
+    if not sheet_rows: return ranges
+    run_start = prev = sheet_rows[0]
+    for r in list(sheet_rows[1:]) + [None]:
+        if r is not None and r == prev + 1:
+            prev = r
+            continue
+        ranges.append((run_start, prev, f"{rowcol_to_a1(run_start, first_col)}:{rowcol_to_a1(prev, last_col)}"))
+        if r is not None:
+            run_start = prev = r
+    return ranges
+
+
+def is_blank(row_data):
+    return not any(str(c).strip() for c in row_data)
+
+
+class NotificationScanner:
+    """Remembers how far the notification poller has read so each tick only
+    fetches rows that could have changed.
+
+    Rows below `hwm` have been read once. Those that may still need a
+    confirmation stay in `watch` and are re-read every tick (one batch_get):
+    unverified rows from orders placed within the last `max_age` seconds,
+    and verified rows not yet marked 'Confirmation Sent' until the caller
+    hands their order to the outbox and calls unwatch(). Older unverified
+    orders are treated as abandoned and dropped, so the watch set follows
+    recent activity rather than the sheet's history. Everything else below
+    the mark is never fetched again. New rows are read from the mark onward.
+    If the spreadsheet's last update time has not moved since the last
+    committed tick, nothing is fetched at all. An old order verified late
+    is handed back with rewatch(). A full rescan runs on first use, every
+    `full_scan_interval` seconds, and whenever a watched row no longer holds
+    the order we expect there.
+    """
+
+    def __init__(self, full_scan_interval=900, max_age=None):
+        self.full_scan_interval = full_scan_interval
+        self.max_age = max_age
+        self.reset()
+
+    def reset(self):
+        self.headers = []
+        self.hwm = 2            # next sheet row never read
+        self.watch = {}         # sheet row -> order id, read but not confirmed yet
+        self.last_full_scan = 0
+        self.last_update_time = None
+        self.pending_update_time = None
+
+    def _last_update_time(self, sheet):
+        try:
+            return sheet.spreadsheet.get_lastUpdateTime()
+        except Exception:
+            return None
+
+    def _full_scan(self, sheet):
+        rows = sheet.get_all_values()
+        self.last_full_scan = time.time()
+        self.headers = rows[0] if rows else []
+        self.watch = {}
+        self.hwm = len(rows) + 1
+        candidates = [(i + 1, rows[i]) for i in range(1, len(rows))]
+        self._track(candidates)
+        return candidates
+
+    def _track(self, candidates):
+        idx_conf_sent = find_col(self.headers, CONF_SENT_COLS)
+        idx_order_id = find_col(self.headers, ORDER_ID_COLS)
+        idx_verified = find_col(self.headers, VERIFIED_COLS)
+        idx_date = find_col(self.headers, ORDER_DATE_COLS)
+        if idx_conf_sent is None or idx_order_id is None: return
+        cell = lambda row_data, idx: row_data[idx] if idx is not None and len(row_data) > idx else ''
+        cutoff = time.time() - self.max_age if self.max_age else None
+        for sheet_row, row_data in candidates:
+            order_id = cell(row_data, idx_order_id)
+            if cell(row_data, idx_conf_sent).strip().lower() == 'yes' or is_blank(row_data):
+                self.watch.pop(sheet_row, None)
+            elif cutoff is not None and cell(row_data, idx_verified).strip().lower() != 'yes' and \
+                    (order_created(order_id, cell(row_data, idx_date)) or 0) < cutoff:
+                # Unverified and older than max_age (or undated): abandoned
+                self.watch.pop(sheet_row, None)
+            else:
+                self.watch[sheet_row] = order_id
+
+    def scan(self, sheet):
+        """Returns (headers, [(sheet_row, row_data), ...]) for rows worth inspecting this tick."""
+        self.pending_update_time = self._last_update_time(sheet)
+
+        if not self.headers or time.time() - self.last_full_scan > self.full_scan_interval:
+            candidates = self._full_scan(sheet)  # sets self.headers
+            return self.headers, candidates
+
+        if self.pending_update_time is not None and self.pending_update_time == self.last_update_time:
+            return self.headers, []
+
+        last_col = len(self.headers)
+        idx_order_id = find_col(self.headers, ORDER_ID_COLS)
+        candidates = []
+
+        # 1. Rows we already know are awaiting confirmation
+        watched = sorted(self.watch)
+        if watched:
+            ranges = coalesce_rows(watched, 1, last_col)
+            results = sheet.batch_get([rng for _, _, rng in ranges])
+            for (start, end, _), values in zip(ranges, results):
+                values = list(values)
+                for sheet_row in range(start, end + 1):
+                    if sheet_row not in self.watch: continue
+                    offset = sheet_row - start
+                    row_data = values[offset] if offset < len(values) else []
+                    current_id = row_data[idx_order_id] if len(row_data) > idx_order_id else ''
+                    if current_id != self.watch[sheet_row]:
+                        # Rows were inserted/deleted above us; row numbers are no longer trustworthy
+                        print("[SYSTEM]: Sheet layout changed, rescanning notifications.")
+                        candidates = self._full_scan(sheet)
+                        return self.headers, candidates
+                    candidates.append((sheet_row, row_data))
+
+        # 2. Rows appended since the last tick
+        end_col = rowcol_to_a1(1, last_col).rstrip('0123456789')
+        tail = sheet.get_values(f"A{self.hwm}:{end_col}")
+        while tail and is_blank(tail[-1]):
+            tail.pop()
+        new_rows = [(self.hwm + i, row_data) for i, row_data in enumerate(tail)]
+        self.hwm += len(tail)
+        candidates.extend(new_rows)
+
+        self._track(candidates)
+        return self.headers, candidates
+
+    def rewatch(self, rows):
+        """Watches [(sheet_row, order_id), ...] again, e.g. abandoned orders that staff have since verified."""
+        added = False
+        for sheet_row, order_id in rows:
+            if sheet_row < self.hwm and sheet_row not in self.watch:
+                self.watch[sheet_row] = order_id
+                added = True
+        if added:
+            # Read them on the next tick even if the sheet has not changed since
+            self.last_update_time = None
+
+    def unwatch(self, sheet_rows):
+        """Stops re-reading rows whose order is queued elsewhere (the outbox keeps their row numbers)."""
+        for sheet_row in sheet_rows:
+            self.watch.pop(sheet_row, None)
+
+    def commit(self):
+        """Called once the tick's candidates are handled, so an unchanged sheet is skipped next tick.
+        Rows stay watched until a later read shows them confirmed, or until unwatch()."""
+        self.last_update_time = self.pending_update_time
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+import time
+
+from leader_lock import LeaderLock
+
+# ID layout (51 bits, Crockford base32, fixed width so string order == time order):
+#   37 bits  centiseconds since EPOCH  (~43 years)
+#    6 bits  node slot, unique per live worker on the host
+#    8 bits  sequence within one centisecond
+EPOCH = 1735689600  # 2025-01-01 UTC
+NODE_BITS = 6
+SEQ_BITS = 8
+ID_WIDTH = 11
+PREFIX = "ID"
+# Customers type these IDs by hand, so there is no I, L, O or U; typed look-alikes are read as 0 and 1
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+LOOKALIKES = str.maketrans("OIL", "011")
+
+
+def _encode(n):
+    out = []
+    while n:
+        n, r = divmod(n, 32)
+        out.append(ALPHABET[r])
+    return "".join(reversed(out)).rjust(ID_WIDTH, "0")
+
+
+def normalize_order_id(text):
+    """The order ID a customer typed, as stored: no '#', and a generated ID in upper case with
+    look-alike letters read as the digits they stand for (ido... -> ID0...). Hand-made IDs
+    keep their case, since staff-typed IDs in the sheet are matched exactly."""
+    order_id = str(text).replace("#", "").strip()
+    generated = order_id.upper()
+    if generated.startswith(PREFIX) and len(generated) == len(PREFIX) + ID_WIDTH:
+        generated = PREFIX + generated[len(PREFIX):].translate(LOOKALIKES)
+        if all(c in ALPHABET for c in generated[len(PREFIX):]): return generated
+    return order_id
+
+
+def decode_order_id(order_id):
+    """Returns the creation time (epoch seconds) of a generated ID, or None for hand-made/invalid IDs."""
+    order_id = normalize_order_id(order_id)
+    if not order_id.startswith(PREFIX) or len(order_id) != len(PREFIX) + ID_WIDTH: return None
+    n = 0
+    for c in order_id[len(PREFIX):]:
+        if c not in ALPHABET: return None
+        n = n * 32 + ALPHABET.index(c)
+    return EPOCH + (n >> (NODE_BITS + SEQ_BITS)) / 100.0
+
+
+def order_created(order_id, order_date):
+    """Epoch seconds from a generated order ID, else from the Order Date cell; None if neither parses."""
+    created = decode_order_id(order_id)
+    if created is not None: return created
+    try:
+        return time.mktime(time.strptime(str(order_date).strip(), "%Y-%m-%d %H:%M:%S"))
+    except ValueError:
+        return None
+
+
+class OrderIdGenerator:
+    """Time-ordered, collision-free order IDs (e.g. ID02MB3WCRG00).
+
+    Each worker claims a node slot through a per-slot file lock, so workers
+    alive at the same time never share a slot; the timestamp keeps IDs unique
+    across restarts.
+    """
+
+    def __init__(self, lock_dir=None):
+        self.lock = threading.Lock()
+        self.lock_dir = lock_dir or tempfile.gettempdir()
+        self.node_lock = None
+        self.node = None
+        self.last_tick = 0
+        self.seq = 0
+
+    def _claim_node(self):
+        for slot in range(1 << NODE_BITS):
+            lock = LeaderLock(os.path.join(self.lock_dir, f"posterman_order_node_{slot}.lock"))
+            if lock.acquire():
+                self.node_lock = lock
+                self.node = slot
+                return
+        raise RuntimeError("No free order ID node slot")
+
+    def next_id(self):
+        with self.lock:
+            if self.node is None:
+                self._claim_node()
+            tick = int((time.time() - EPOCH) * 100)
+            if tick < self.last_tick:
+                # Clock stepped backwards; keep issuing from the last tick
+                tick = self.last_tick
+            if tick == self.last_tick:
+                self.seq += 1
+                if self.seq >= 1 << SEQ_BITS:
+                    # Sequence exhausted for this centisecond; wait for the next one
+                    while tick <= self.last_tick:
+                        time.sleep(0.001)
+                        tick = int((time.time() - EPOCH) * 100)
+                    self.seq = 0
+            else:
+                self.seq = 0
+            self.last_tick = tick
+            n = (tick << (NODE_BITS + SEQ_BITS)) | (self.node << SEQ_BITS) | self.seq
+            return PREFIX + _encode(n)
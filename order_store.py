@@ -0,0 +1,434 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from gspread.utils import rowcol_to_a1
+
+from order_ids import decode_order_id, order_created
+from sheet_columns import DEFAULT_HEADERS, ORDER_DATE_COLS, ORDER_ID_COLS, VERIFIED_COLS, find_col
+
+
+def column_letter(col):
+    return rowcol_to_a1(1, col).rstrip('0123456789')
+
+
+# Sets payment_verified and stamps verified_at when it turns 'yes'; parameters are (value, now, value)
+SET_VERIFIED = (
+    "verified_at = CASE WHEN LOWER(TRIM(?)) = 'yes' AND LOWER(TRIM(payment_verified)) != 'yes' "
+    "THEN ? ELSE verified_at END, payment_verified = ?"
+)
+
+
+class SheetLayoutChanged(Exception):
+    """A sheet row no longer holds the order recorded for it (rows deleted, inserted or sorted)."""
+
+
+class OrderStore(ABC):
+    """Interface for the primary order store behind IDecorBot and SheetMirror.
+
+    Orders are stored as sheet-shaped rows ("lines", one per cart item).
+    The Google Sheet is a mirror: lines are pushed to it after they are
+    stored, and staff edits (Payment Verified, orders typed in by hand) are
+    pulled back with apply_sheet_rows / apply_verified_column. Small shared
+    values (the sheet's headers, pull progress) live under get_meta/set_meta.
+    """
+
+    # --- Bot side ---
+
+    @abstractmethod
+    def add_order(self, order_id, rows): ...
+
+    @abstractmethod
+    def get_order(self, order_id):
+        """Returns the order's first line as a {header: value} dict, or None."""
+
+    @abstractmethod
+    def awaiting_verification(self, since):
+        """Number of orders created at or after `since` (epoch seconds) whose payment is not verified."""
+
+    @abstractmethod
+    def verified_since(self, since, created_before):
+        """[(sheet_row, order_id), ...] for placed lines of orders created before `created_before`
+        whose payment was verified in the sheet at or after `since`."""
+
+    @abstractmethod
+    def unmirrored_count(self): ...
+
+    # --- Shared state ---
+
+    @property
+    @abstractmethod
+    def headers(self):
+        """The sheet's header row as last pulled."""
+
+    @abstractmethod
+    def get_meta(self, key, default=None): ...
+
+    @abstractmethod
+    def set_meta(self, key, value): ...
+
+    @abstractmethod
+    def claim_interval(self, key, interval):
+        """True for the one caller that finds more than `interval` seconds since the time stored under `key`."""
+
+    # --- Push to the sheet ---
+
+    @abstractmethod
+    def claim_unmirrored(self, limit): ...
+
+    @abstractmethod
+    def mark_mirrored(self, line_ids): ...
+
+    @abstractmethod
+    def release(self, line_ids, error): ...
+
+    # --- Pull from the sheet ---
+
+    @abstractmethod
+    def apply_sheet_rows(self, headers, rows, first_row, reset=False): ...
+
+    @abstractmethod
+    def apply_verified_column(self, order_ids, values): ...
+
+
+class SQLiteOrderStore(OrderStore):
+    """Indexed SQLite order store shared by every worker on the host (WAL mode).
+
+    Lines waiting for the sheet are claimed with a lease so two workers never
+    append the same line, unless a claimer dies mid-write (the lease then
+    expires and the line is retried - at-least-once delivery).
+    """
+
+    def __init__(self, path, lease=120):
+        self.path = path
+        self.lease = lease
+        self.local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS order_lines ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, order_id TEXT NOT NULL, line_no INTEGER NOT NULL, "
+            "data TEXT NOT NULL, payment_verified TEXT NOT NULL DEFAULT '', sheet_row INTEGER, "
+            "mirror_status TEXT NOT NULL DEFAULT 'pending', claimed_until REAL NOT NULL DEFAULT 0, "
+            "attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, created REAL NOT NULL, verified_at REAL, "
+            "UNIQUE (order_id, line_no))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lines_mirror ON order_lines(mirror_status, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lines_sheet_row ON order_lines(sheet_row)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lines_created ON order_lines(created)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lines_verified_at ON order_lines(verified_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            # WAL + NORMAL: commits survive a process crash without an fsync per insert
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value, conn=None):
+        (conn or self._conn()).execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value))
+        )
+
+    def claim_interval(self, key, interval):
+        """True for the one caller, across all workers, that finds more than `interval` seconds
+        since the time stored under `key`; it stores the current time."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            claimed = now - self.get_meta(key, 0) > interval
+            if claimed: self.set_meta(key, now, conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return claimed
+
+    @property
+    def headers(self):
+        """The sheet's header row as last pulled by any worker."""
+        return self.get_meta("headers", DEFAULT_HEADERS)
+
+    # --- Bot side ---
+
+    def add_order(self, order_id, rows):
+        idx_verified = find_col(self.headers, VERIFIED_COLS)
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO order_lines (order_id, line_no, data, payment_verified, created) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (order_id, line_no, json.dumps([str(c) for c in row]),
+                     str(row[idx_verified]) if idx_verified is not None else '', now)
+                    for line_no, row in enumerate(rows)
+                ],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_order(self, order_id):
+        row = self._conn().execute(
+            "SELECT data, payment_verified FROM order_lines WHERE order_id = ? ORDER BY line_no LIMIT 1",
+            (str(order_id).strip(),),
+        ).fetchone()
+        if row is None: return None
+        headers = self.headers
+        record = dict(zip(headers, json.loads(row[0])))
+        idx_verified = find_col(headers, VERIFIED_COLS)
+        if idx_verified is not None:
+            record[headers[idx_verified]] = row[1]
+        return record
+
+    def awaiting_verification(self, since):
+        return self._conn().execute(
+            "SELECT COUNT(DISTINCT order_id) FROM order_lines WHERE created >= ? AND LOWER(TRIM(payment_verified)) != 'yes'",
+            (since,),
+        ).fetchone()[0]
+
+    def verified_since(self, since, created_before):
+        return self._conn().execute(
+            "SELECT sheet_row, order_id FROM order_lines "
+            "WHERE verified_at >= ? AND created < ? AND sheet_row IS NOT NULL",
+            (since, created_before),
+        ).fetchall()
+
+    def order_count(self):
+        return self._conn().execute("SELECT COUNT(DISTINCT order_id) FROM order_lines").fetchone()[0]
+
+    # --- Push to the sheet ---
+
+    def claim_unmirrored(self, limit=200):
+        """Leases up to `limit` lines not yet in the sheet; returns [(line_id, row), ...] in insert order."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            found = conn.execute(
+                "SELECT id, data FROM order_lines WHERE mirror_status = 'pending' AND claimed_until < ? "
+                "ORDER BY id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            if found:
+                conn.executemany(
+                    "UPDATE order_lines SET claimed_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + self.lease, line_id) for line_id, _ in found],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(line_id, json.loads(data)) for line_id, data in found]
+
+    def mark_mirrored(self, line_ids):
+        self._conn().executemany(
+            "UPDATE order_lines SET mirror_status = 'written' WHERE id = ?", [(i,) for i in line_ids]
+        )
+
+    def release(self, line_ids, error):
+        """Returns failed lines to the queue so the next push retries them."""
+        self._conn().executemany(
+            "UPDATE order_lines SET claimed_until = 0, last_error = ? WHERE id = ?",
+            [(str(error), i) for i in line_ids],
+        )
+
+    def unmirrored_count(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM order_lines WHERE mirror_status = 'pending'"
+        ).fetchone()[0]
+
+    # --- Pull from the sheet ---
+
+    def apply_sheet_rows(self, headers, rows, first_row, reset=False):
+        """Upserts sheet rows (first_row = sheet row number of rows[0]) and records their positions.
+
+        A row updates the line recorded at that position only if it holds the
+        same order; otherwise it is matched to an unplaced line of its order
+        (one we pushed, or any line after reset=True forgets all positions
+        for a full re-read). Anything else (typed in by staff) becomes a new,
+        already-mirrored line, created when its ID or Order Date says (0 if
+        neither parses, so old hand-typed rows never count as awaiting).
+        """
+        idx_id = find_col(headers, ORDER_ID_COLS)
+        idx_verified = find_col(headers, VERIFIED_COLS)
+        idx_date = find_col(headers, ORDER_DATE_COLS)
+        if idx_id is None: return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.set_meta("headers", list(headers), conn)
+            if reset:
+                conn.execute("UPDATE order_lines SET sheet_row = NULL WHERE sheet_row IS NOT NULL")
+            for offset, row_data in enumerate(rows):
+                if len(row_data) <= idx_id: continue
+                order_id = str(row_data[idx_id]).strip()
+                if not order_id: continue
+                sheet_row = first_row + offset
+                verified = row_data[idx_verified] if idx_verified is not None and len(row_data) > idx_verified else ''
+                data = json.dumps([str(c) for c in row_data])
+
+                placed = conn.execute(
+                    "SELECT id FROM order_lines WHERE sheet_row = ? AND order_id = ?", (sheet_row, order_id)
+                ).fetchone()
+                if placed:
+                    conn.execute(
+                        f"UPDATE order_lines SET data = ?, {SET_VERIFIED} WHERE id = ?",
+                        (data, verified, time.time(), verified, placed[0]),
+                    )
+                    continue
+                # Another order was recorded here before rows moved; it gets placed again when its row is read
+                conn.execute("UPDATE order_lines SET sheet_row = NULL WHERE sheet_row = ?", (sheet_row,))
+                unplaced = conn.execute(
+                    "SELECT id FROM order_lines WHERE order_id = ? AND sheet_row IS NULL "
+                    "ORDER BY mirror_status = 'pending', line_no LIMIT 1",
+                    (order_id,),
+                ).fetchone()
+                if unplaced:
+                    conn.execute(
+                        f"UPDATE order_lines SET sheet_row = ?, data = ?, {SET_VERIFIED}, mirror_status = 'written' "
+                        "WHERE id = ?",
+                        (sheet_row, data, verified, time.time(), verified, unplaced[0]),
+                    )
+                    continue
+                line_no = conn.execute(
+                    "SELECT COALESCE(MAX(line_no) + 1, 0) FROM order_lines WHERE order_id = ?", (order_id,)
+                ).fetchone()[0]
+                order_date = row_data[idx_date] if idx_date is not None and len(row_data) > idx_date else ''
+                conn.execute(
+                    "INSERT INTO order_lines (order_id, line_no, data, payment_verified, sheet_row, mirror_status, created) "
+                    "VALUES (?, ?, ?, ?, ?, 'written', ?)",
+                    (order_id, line_no, data, verified, sheet_row, order_created(order_id, order_date) or 0),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def apply_verified_column(self, order_ids, values):
+        """order_ids / values = the sheet's Order ID and Payment Verified columns from row 2 down.
+
+        Raises SheetLayoutChanged, without applying anything, if any placed
+        line's row now holds a different order.
+        """
+        conn = self._conn()
+        current = conn.execute(
+            "SELECT id, sheet_row, order_id, payment_verified FROM order_lines WHERE sheet_row IS NOT NULL"
+        ).fetchall()
+        changes = []
+        for line_id, sheet_row, order_id, verified in current:
+            offset = sheet_row - 2
+            if offset >= len(order_ids) or order_ids[offset].strip() != order_id:
+                raise SheetLayoutChanged(f"Row {sheet_row} no longer holds order {order_id}")
+            new_value = values[offset] if offset < len(values) else ''
+            if new_value != verified:
+                changes.append((new_value, line_id))
+        if changes:
+            now = time.time()
+            conn.executemany(
+                f"UPDATE order_lines SET {SET_VERIFIED} WHERE id = ?",
+                [(value, now, value, line_id) for value, line_id in changes],
+            )
+        return len(changes)
+
+
+class SheetMirror:
+    """Keeps an OrderStore and the Google Sheet eventually consistent.
+
+    push() appends unmirrored lines in one append_rows call. pull() reads
+    only rows appended since the last pull plus the Order ID and Payment
+    Verified columns (one batch_get), so staff edits reach the store within
+    `max_age` seconds. Edits are matched on (sheet row, Order ID); if rows
+    were deleted, inserted or sorted, the whole sheet is re-read.
+
+    The time of the last pull is kept in the store's meta table, so workers
+    sharing a store take turns (claim_pull) instead of each pulling.
+    """
+
+    def __init__(self, store, max_age=30, miss_refresh_interval=5):
+        self.store = store
+        self.max_age = max_age
+        self.miss_refresh_interval = miss_refresh_interval
+        self.last_miss_pull = 0
+        self.wakeup = threading.Event()
+
+    def push(self, write_rows, batch_size=200):
+        """Writes up to batch_size pending lines via write_rows(rows). Returns lines written."""
+        batch = self.store.claim_unmirrored(batch_size)
+        if not batch: return 0
+        line_ids = [line_id for line_id, _ in batch]
+        try:
+            write_rows([row for _, row in batch])
+        except Exception as e:
+            self.store.release(line_ids, e)
+            raise
+        self.store.mark_mirrored(line_ids)
+        return len(batch)
+
+    def pull(self, sheet, full=False):
+        rows_synced = 0 if full else self.store.get_meta("rows_synced", 0)
+        headers = self.store.headers
+        idx_id = find_col(headers, ORDER_ID_COLS)
+        idx_verified = find_col(headers, VERIFIED_COLS)
+        if rows_synced == 0 or idx_id is None or idx_verified is None:
+            rows_synced = 0
+            rows = sheet.get_all_values()
+            headers = rows[0] if rows else []
+            new_rows = rows[1:]
+        else:
+            id_col, verified_col = column_letter(idx_id + 1), column_letter(idx_verified + 1)
+            ids, verified, new_rows = sheet.batch_get([
+                f"{id_col}2:{id_col}", f"{verified_col}2:{verified_col}",
+                f"A{rows_synced + 2}:{column_letter(len(headers))}",
+            ])
+            try:
+                self.store.apply_verified_column([r[0] if r else '' for r in ids], [r[0] if r else '' for r in verified])
+            except SheetLayoutChanged as e:
+                print(f"[SYSTEM]: Sheet layout changed ({e}), re-reading all orders.")
+                return self.pull(sheet, full=True)
+            new_rows = list(new_rows)
+        while new_rows and not any(str(c).strip() for c in new_rows[-1]):
+            new_rows.pop()
+
+        if headers:
+            self.store.apply_sheet_rows(headers, new_rows, rows_synced + 2, reset=not rows_synced)
+            self.store.set_meta("rows_synced", rows_synced + len(new_rows))
+        self.store.set_meta("last_pull", time.time())
+        return len(new_rows)
+
+    def claim_pull(self):
+        """True if no worker sharing the store has pulled in the last `max_age` seconds; the caller should pull now."""
+        return self.store.claim_interval("last_pull", self.max_age)
+
+    def should_pull_on_miss(self, order_id, write_delay=600):
+        """One bounded pull for unknown IDs, skipped when the ID's timestamp shows it predates our last pull.
+
+        write_delay covers orders still queued in another host's store.
+        Legacy IDs carry no timestamp, so they always qualify.
+        """
+        if time.time() - self.last_miss_pull < self.miss_refresh_interval: return False
+        created = decode_order_id(order_id)
+        if created is not None and created <= self.store.get_meta("last_pull", 0) - write_delay: return False
+        self.last_miss_pull = time.time()
+        return True
+
+
+def default_store_path(base_dir):
+    """ORDER_DB, else instance/orders.db."""
+    if os.environ.get("ORDER_DB"): return os.environ["ORDER_DB"]
+    instance_dir = os.path.join(base_dir, "instance")
+    os.makedirs(instance_dir, exist_ok=True)
+    return os.path.join(instance_dir, "orders.db")
@@ -0,0 +1,110 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+
+
+def is_quota_error(error):
+    """True for Google API 429 (RESOURCE_EXHAUSTED) responses."""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429 or getattr(error, "code", None) == 429
+
+
+class AdaptivePoller:
+    """Decides how long the notification monitor sleeps between sheet checks.
+
+    - While orders await payment verification (or a tick found work) it
+      polls every `fast` seconds; otherwise the interval grows by `growth`
+      per quiet tick up to `idle`.
+    - Errors back off exponentially from `fast` (quota errors from 4x
+      `fast`) up to `max_backoff`, with jitter so workers on several hosts
+      don't retry in step. The last errors are kept for /health.
+    - trigger() ends the current wait early. It also touches a trigger
+      file, so a request served by any worker on the host wakes the
+      leader's poller.
+    """
+
+    def __init__(self, fast=5, idle=120, growth=1.5, max_backoff=600, trigger_file=None, check_every=1.0):
+        self.fast = fast
+        self.idle = idle
+        self.growth = growth
+        self.max_backoff = max_backoff
+        self.check_every = check_every
+        self.trigger_file = trigger_file or os.environ.get(
+            "MONITOR_TRIGGER_FILE", os.path.join(tempfile.gettempdir(), "posterman_monitor.trigger")
+        )
+        self.trigger_event = threading.Event()
+        self.trigger_mtime = self._trigger_mtime()
+        self.random = random.Random()
+
+        self.interval = fast
+        self.failures = 0
+        self.ticks = 0
+        self.error_count = 0
+        self.errors = deque(maxlen=10)
+        self.last_success = None
+
+    def record_success(self, busy):
+        """Returns the delay before the next tick."""
+        self.ticks += 1
+        self.failures = 0
+        self.last_success = time.time()
+        self.interval = self.fast if busy else min(self.idle, self.interval * self.growth)
+        return self.interval
+
+    def record_error(self, error):
+        """Records the error and returns the backoff delay before the next tick."""
+        self.ticks += 1
+        self.failures += 1
+        self.error_count += 1
+        quota = is_quota_error(error)
+        base = self.fast * 4 if quota else self.fast
+        delay = min(self.max_backoff, base * 2 ** (self.failures - 1)) * self.random.uniform(0.5, 1.0)
+        self.errors.append({
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "error": f"{type(error).__name__}: {error}",
+            "quota": quota,
+        })
+        return delay
+
+    def trigger(self):
+        """Wakes the poller now (e.g. staff pressed "verify now")."""
+        self.trigger_event.set()
+        try:
+            with open(self.trigger_file, "a"):
+                pass
+            os.utime(self.trigger_file, None)
+        except OSError as e:
+            print(f"[ERROR]: Could not touch {self.trigger_file}: {e}")
+
+    def _trigger_mtime(self):
+        try:
+            return os.stat(self.trigger_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def wait(self, delay):
+        """Sleeps up to delay seconds. Returns True if woken early by trigger()."""
+        deadline = time.monotonic() + delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: return False
+            if self.trigger_event.wait(min(remaining, self.check_every)):
+                self.trigger_event.clear()
+                self.trigger_mtime = self._trigger_mtime()
+                return True
+            mtime = self._trigger_mtime()
+            if mtime != self.trigger_mtime:
+                self.trigger_mtime = mtime
+                return True
+
+    def status(self):
+        return {
+            "interval_seconds": round(self.interval, 1),
+            "consecutive_failures": self.failures,
+            "errors": self.error_count,
+            "last_success": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_success)) if self.last_success else None,
+            "recent_errors": list(self.errors),
+        }
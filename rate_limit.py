@@ -0,0 +1,51 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets: each key may spend `burst` requests at once,
+    refilled at `per_minute` / 60 tokens per second.
+
+    Buckets live in an LRU capped at max_keys; a key that falls out simply
+    starts again with a full bucket.
+    """
+
+    def __init__(self, per_minute, burst=None, max_keys=50000):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst if burst is not None else max(per_minute // 6, 5))
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()   # key -> [tokens, last refill]
+
+    def allow(self, key, cost=1):
+        """Takes `cost` tokens from key's bucket. Returns 0 if allowed, else seconds until it would be."""
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [self.burst, now]
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            return (cost - bucket[0]) / self.rate if self.rate else float("inf")
+
+
+def client_ip(remote_addr, forwarded_for=None, proxy_hops=1):
+    """The caller's address behind `proxy_hops` trusted reverse proxies (Render adds one).
+
+    Each proxy appends the address it received from to X-Forwarded-For, so
+    the client is the proxy_hops-th entry from the right; entries further
+    left are client-supplied and not trusted.
+    """
+    if proxy_hops and forwarded_for:
+        hops = [h.strip() for h in forwarded_for.split(",") if h.strip()]
+        if len(hops) >= proxy_hops:
+            return hops[-proxy_hops]
+    return remote_addr or "unknown"
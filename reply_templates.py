@@ -0,0 +1,55 @@
+import hashlib
+import json
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _etag(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+class StaticReply(dict):
+    """A fixed bot reply. It is still a plain {"text", "options"} dict for the
+    handlers, but its /chat body and ETag are serialized once at startup."""
+
+    def __init__(self, text, options):
+        super().__init__(text=text, options=list(options))
+        self.body = _dumps({"response": self})
+        self.etag = _etag(self.body)
+
+
+class RenderedReply(dict):
+    """Output of ReplyTemplate.render, carrying its already-built /chat body."""
+
+    def __init__(self, text, options, body):
+        super().__init__(text=text, options=options)
+        self.body = body
+        self.etag = _etag(body)
+
+
+class ReplyTemplate:
+    """A reply with str.format fields in its text and fixed options.
+
+    Everything except the formatted text is serialized up front, so
+    render() costs one format_map and one json.dumps of a short string.
+    """
+
+    def __init__(self, text, options):
+        self.text = text
+        self.options = list(options)
+        self.prefix = b'{"response":{"text":'
+        self.suffix = b',"options":' + _dumps(self.options) + b'}}'
+
+    def render(self, **fields):
+        text = self.text.format_map(fields)
+        return RenderedReply(text, self.options, self.prefix + _dumps(text) + self.suffix)
+
+
+def response_body(reply):
+    """Returns (body bytes, etag) for a /chat reply; etag is None for ad-hoc dicts."""
+    body = getattr(reply, "body", None)
+    if body is not None:
+        return body, reply.etag
+    return _dumps({"response": reply}), None
@@ -0,0 +1,64 @@
+import collections
+import os
+import sys
+import threading
+
+
+class SamplingProfiler:
+    """Statistical profiler: a background thread snapshots every other
+    thread's Python stack each `interval` seconds and counts identical stacks.
+
+    Output is in the collapsed format ("outer;inner;leaf count" per line)
+    read by flamegraph.pl and speedscope. Overhead is only paid while running.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.lock = threading.Lock()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        with self.lock:
+            if self.running: return False
+            self.stacks.clear()
+            self.samples = 0
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self.thread.start()
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None: self.thread.join()
+
+    def profile(self, seconds):
+        """Samples for `seconds` and returns the collapsed stacks; None if a run is already in progress."""
+        if not self.start(): return None
+        self.stop_event.wait(seconds)
+        self.stop()
+        return self.collapsed()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own: continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class SessionStore(ABC):
+    """Interface for conversation session storage.
+
+    get() returns a session dict (or None); callers mutate it and hand it back
+    with save(), so backends that serialize (SQLite) see the changes.
+    Backends count evictions by reason and get() hits/misses in the
+    attributes set here.
+    """
+
+    def __init__(self):
+        self.evictions = {"ttl": 0, "lru": 0}
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def get(self, user_id): ...
+
+    @abstractmethod
+    def save(self, user_id, session): ...
+
+    @abstractmethod
+    def delete(self, user_id): ...
+
+    @abstractmethod
+    def stats(self):
+        """Backend name, session count and size, plus the counters; may be slow."""
+
+    def counters(self):
+        """Evictions by reason and get() hits/misses since start; cheap, unlike stats()."""
+        return {"evictions": dict(self.evictions), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return self.stats()["sessions"]
+
+
+class MemorySessionStore(SessionStore):
+    """Single-process store: LRU-bounded to max_sessions, idle sessions expire after ttl seconds."""
+
+    def __init__(self, max_sessions=10000, ttl=6 * 3600):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()   # user_id -> (last_seen, session, serialized size)
+        self.approx_bytes = 0           # sum of the sizes, so stats() never re-serializes every session
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.sessions.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            last_seen, session, size = entry
+            if time.time() - last_seen > self.ttl:
+                del self.sessions[user_id]
+                self.approx_bytes -= size
+                self.evictions["ttl"] += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.sessions.move_to_end(user_id)
+            return session
+
+    def save(self, user_id, session):
+        size = len(json.dumps(session, default=str))
+        with self.lock:
+            old = self.sessions.get(user_id)
+            if old: self.approx_bytes -= old[2]
+            self.sessions[user_id] = (time.time(), session, size)
+            self.approx_bytes += size
+            self.sessions.move_to_end(user_id)
+            self._evict()
+
+    def _evict(self):
+        # Oldest entries sit at the front, so expired ones are popped first
+        now = time.time()
+        while self.sessions:
+            user_id, (last_seen, _, size) = next(iter(self.sessions.items()))
+            if now - last_seen > self.ttl:
+                self.evictions["ttl"] += 1
+            elif len(self.sessions) > self.max_sessions:
+                self.evictions["lru"] += 1
+            else:
+                break
+            self.sessions.popitem(last=False)
+            self.approx_bytes -= size
+
+    def delete(self, user_id):
+        with self.lock:
+            entry = self.sessions.pop(user_id, None)
+            if entry: self.approx_bytes -= entry[2]
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "approx_bytes": self.approx_bytes,
+                "evictions": dict(self.evictions),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store shared by every worker on the host through one SQLite file (WAL mode).
+
+    Expired and over-limit sessions are purged every `purge_every` saves.
+    """
+
+    def __init__(self, path, max_sessions=100000, ttl=6 * 3600, purge_every=200):
+        super().__init__()
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.saves = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id TEXT PRIMARY KEY, data TEXT NOT NULL, last_seen REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions(last_seen)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self.local.conn = conn
+        return conn
+
+    def get(self, user_id):
+        row = self._conn().execute(
+            "SELECT data, last_seen FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def save(self, user_id, session):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (user_id, data, last_seen) VALUES (?, ?, ?)",
+            (user_id, json.dumps(session, default=str), time.time()),
+        )
+        conn.commit()
+        with self.lock:
+            self.saves += 1
+            purge = self.saves % self.purge_every == 0
+        if purge:
+            self.purge()
+
+    def purge(self):
+        conn = self._conn()
+        expired = conn.execute("DELETE FROM sessions WHERE last_seen < ?", (time.time() - self.ttl,)).rowcount
+        over = conn.execute(
+            "DELETE FROM sessions WHERE user_id IN ("
+            "SELECT user_id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        ).rowcount
+        conn.commit()
+        self.evictions["ttl"] += expired
+        self.evictions["lru"] += over
+
+    def delete(self, user_id):
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        conn.commit()
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def stats(self):
+        count, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions"
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "sessions": count,
+            "max_sessions": self.max_sessions,
+            "approx_bytes": total,
+            "db_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "evictions": dict(self.evictions),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def create_session_store():
+    """Picks the backend from SESSION_STORE ('memory' or 'sqlite') and SESSION_DB."""
+    backend = os.environ.get("SESSION_STORE", "memory").strip().lower()
+    ttl = int(os.environ.get("SESSION_TTL", 6 * 3600))
+    if backend == "sqlite":
+        path = os.environ.get("SESSION_DB")
+        if not path:
+            instance_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+            os.makedirs(instance_dir, exist_ok=True)
+            path = os.path.join(instance_dir, "sessions.db")
+        return SQLiteSessionStore(path, ttl=ttl)
+    return MemorySessionStore(ttl=ttl)
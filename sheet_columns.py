@@ -0,0 +1,33 @@
+# Column layout of the order sheet (google_sheets_migration.md), used until the real header is read
+DEFAULT_HEADERS = [
+    'Order ID', 'Customer Name', 'Product Name', 'Product Type', 'Size', 'Quantity',
+    'Order Date', 'address', 'Contact no.', 'another contact no.', 'Payment Verified', 'Confirmation Sent'
+]
+# Header aliases (the live sheet has used both spellings)
+ORDER_ID_COLS = ['Order ID', '- Order ID']
+ORDER_DATE_COLS = ['Order Date', '- Order Date']
+PHONE_COLS = ['Contact no.', '- Contact no.']
+VERIFIED_COLS = ['Payment Verified', '- Payment Verified']
+CONF_SENT_COLS = ['Confirmation Sent', '- Confirmation Sent']
+
+
+def find_col(headers, possible_names):
+    """Index of the first of possible_names found in headers, or None."""
+    for name in possible_names:
+        if name in headers: return headers.index(name)
+    return None
+
+
+def require_col(headers, possible_names):
+    """Like find_col, but a missing column raises ValueError."""
+    idx = find_col(headers, possible_names)
+    if idx is None:
+        raise ValueError(f"Sheet has no '{possible_names[0]}' column")
+    return idx
+
+
+def record_value(record, possible_names):
+    """The first non-empty value among possible_names in a {header: value} record."""
+    for name in possible_names:
+        if record.get(name): return record[name]
+    return ''
@@ -0,0 +1,128 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import gspread
+import requests
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Worksheet methods that only read; anything else is treated as a write
+READ_METHODS = {
+    "get", "get_values", "get_all_values", "get_all_records", "batch_get",
+    "col_values", "row_values", "acell", "cell", "find", "findall",
+}
+
+
+class SheetsClient:
+    """One long-lived Google Sheets client per process.
+
+    - Keep-alive HTTP connections are pooled in a single AuthorizedSession,
+      so calls after the first skip TLS and auth setup.
+    - The access token is refreshed `refresh_margin` seconds before it
+      expires, under a lock, so the monitor thread and request handlers
+      never refresh twice or send an expired token.
+    - Reads are retried on quota (429), transient 5xx and connection
+      errors with jittered exponential backoff. Writes are retried on 429
+      only: a 5xx or dropped connection may come after the write was
+      applied, and retrying e.g. append_rows would add the rows twice.
+    """
+
+    def __init__(self, creds_info, scopes=SCOPES, pool_size=10, refresh_margin=300,
+                 max_retries=5, max_backoff=32, timeout=30):
+        self.credentials = Credentials.from_service_account_info(creds_info, scopes=scopes)
+        self.refresh_margin = refresh_margin
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        # Token refreshes get their own pooled session (it must not carry the bearer header)
+        self.token_session = requests.Session()
+        self.token_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session = AuthorizedSession(self.credentials, auth_request=Request(self.token_session))
+        self.session.mount("https://", adapter)
+        self.client = gspread.Client(auth=None, session=self.session)
+        self.client.set_timeout(timeout)
+
+        self.stats = {"calls": 0, "retries": 0, "refreshes": 0}
+
+    def ensure_token(self):
+        """Refreshes the token if it is missing or expires within refresh_margin."""
+        if self._token_fresh(): return
+        with self.lock:
+            if self._token_fresh(): return
+            self.credentials.refresh(Request(self.token_session))
+            self.stats["refreshes"] += 1
+
+    def _token_fresh(self):
+        expiry = self.credentials.expiry  # naive UTC, as google-auth stores it
+        return bool(self.credentials.token) and expiry is not None and \
+            expiry - datetime.utcnow() > timedelta(seconds=self.refresh_margin)
+
+    def call(self, fn, *args, max_retries=None, **kwargs):
+        """Runs a read-only gspread call with a fresh token, retrying quota/5xx/connection errors with backoff."""
+        return self._call(fn, args, kwargs, write=False, max_retries=max_retries)
+
+    def call_write(self, fn, *args, max_retries=None, **kwargs):
+        """Runs a gspread write with a fresh token, retrying only quota (429) rejections.
+
+        Other errors go to the caller; order_mirror re-queues the lines and
+        retries with its own backoff.
+        """
+        return self._call(fn, args, kwargs, write=True, max_retries=max_retries)
+
+    def _call(self, fn, args, kwargs, write, max_retries=None):
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            self.ensure_token()
+            self.stats["calls"] += 1
+            try:
+                return fn(*args, **kwargs)
+            except (gspread.exceptions.APIError, requests.exceptions.ConnectionError) as e:
+                response = getattr(e, "response", None)
+                status = getattr(response, "status_code", None)
+                if write:
+                    retryable = status == 429
+                else:
+                    retryable = status in RETRY_STATUSES or isinstance(e, requests.exceptions.ConnectionError)
+                if not retryable or attempt == max_retries: raise
+                delay = min(2 ** attempt, self.max_backoff) * random.uniform(0.5, 1.0)
+                self.stats["retries"] += 1
+                print(f"[SYSTEM]: Sheets call {getattr(fn, '__name__', fn)} got {status or e}; retrying in {delay:.1f}s.")
+                time.sleep(delay)
+
+    def open_worksheet(self, sheet_name):
+        spreadsheet = self.call(self.client.open, sheet_name)
+        return ManagedWorksheet(self, spreadsheet.sheet1)
+
+
+class ManagedWorksheet:
+    """Worksheet proxy: reads go through SheetsClient.call, everything else through call_write.
+
+    max_retries overrides the client's retry budget; see with_retries().
+    """
+
+    def __init__(self, client, worksheet, max_retries=None):
+        self._client = client
+        self._worksheet = worksheet
+        self._max_retries = max_retries
+
+    def with_retries(self, max_retries):
+        """The same worksheet with a smaller retry budget, for calls made while a customer waits."""
+        return ManagedWorksheet(self._client, self._worksheet, max_retries)
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr): return attr
+
+        call = self._client.call if name in READ_METHODS else self._client.call_write
+
+        def managed(*args, **kwargs):
+            return call(attr, *args, max_retries=self._max_retries, **kwargs)
+        managed.__name__ = name
+        return managed
@@ -0,0 +1,82 @@
+from notification_dispatcher import NotificationDispatcher, StubTransport, create_transport
+from notification_outbox import SQLiteOutbox
+
+
+def queued_outbox(tmp_path):
+    outbox = SQLiteOutbox(str(tmp_path / "orders.db"))
+    outbox.enqueue([("IDA", "9876543210", "Your order #IDA is Confirmed! ✅", [2, 3]),
+                    ("IDB", "9876500000", "Your order #IDB is Confirmed! ✅", [4])])
+    return outbox
+
+
+def test_nothing_is_sent_or_confirmed_without_a_transport(tmp_path, monkeypatch):
+    monkeypatch.delenv("NOTIFY_TRANSPORT", raising=False)
+    outbox = queued_outbox(tmp_path)
+    dispatcher = NotificationDispatcher(outbox, create_transport())
+
+    assert dispatcher.dispatch() == 0
+    assert dispatcher.confirm(lambda deliveries: [o for o, _ in deliveries]) == 0
+    assert outbox.count("pending") == 2
+
+
+def test_failed_sends_stay_unconfirmed_and_are_retried(tmp_path):
+    outbox = queued_outbox(tmp_path)
+    transport = StubTransport(fail_rate=1.0, quiet=True)
+    dispatcher = NotificationDispatcher(outbox, transport, retry_base=0)
+    assert dispatcher.dispatch() == 0
+    assert outbox.claim_unconfirmed() == []
+
+    transport.fail_rate = 0
+    assert dispatcher.dispatch() == 2
+    assert sorted(outbox.claim_unconfirmed()) == [("IDA", [2, 3]), ("IDB", [4])]
+
+
+def test_enqueue_is_idempotent_by_order_id(tmp_path):
+    outbox = queued_outbox(tmp_path)
+    transport = StubTransport(quiet=True)
+    dispatcher = NotificationDispatcher(outbox, transport)
+    dispatcher.dispatch()
+    dispatcher.confirm(lambda deliveries: [o for o, _ in deliveries])
+
+    # Another line of the order verified later: no second message, but its row still gets marked
+    assert outbox.enqueue([("IDA", "9876543210", "Your order #IDA is Confirmed! ✅", [9])]) == 0
+    assert dispatcher.dispatch() == 0
+    assert len(transport.sent) == 2
+    assert outbox.claim_unconfirmed() == [("IDA", [9])]
+
+
+def test_failed_messages_can_be_requeued(tmp_path):
+    outbox = queued_outbox(tmp_path)
+    transport = StubTransport(fail_rate=1.0, quiet=True)
+    dispatcher = NotificationDispatcher(outbox, transport, retry_base=0)
+    outbox.max_attempts = 1
+    dispatcher.dispatch()
+    assert outbox.count("failed") == 2
+
+    transport.fail_rate = 0
+    assert dispatcher.dispatch() == 0
+    assert outbox.retry_failed() == 2
+    assert dispatcher.dispatch() == 2
+
+
+def test_rows_merged_while_confirming_are_kept(tmp_path):
+    outbox = queued_outbox(tmp_path)
+    dispatcher = NotificationDispatcher(outbox, StubTransport(quiet=True))
+    dispatcher.dispatch()
+
+    def confirm_rows(deliveries):
+        # The monitor thread finds another verified line of IDA mid-confirm
+        outbox.enqueue([("IDA", "9876543210", "Your order #IDA is Confirmed! ✅", [9])])
+        return [order_id for order_id, _ in deliveries]
+
+    assert dispatcher.confirm(confirm_rows) == 2
+    assert outbox.claim_unconfirmed() == [("IDA", [9])]
+
+
+def test_unconfirmed_orders_are_leased_to_one_worker(tmp_path):
+    outbox = queued_outbox(tmp_path)
+    NotificationDispatcher(outbox, StubTransport(quiet=True)).dispatch()
+    other_worker = SQLiteOutbox(str(tmp_path / "orders.db"))
+
+    assert len(outbox.claim_unconfirmed()) == 2
+    assert other_worker.claim_unconfirmed() == []
@@ -0,0 +1,60 @@
+import time
+
+from fake_sheet import FakeWorksheet, ORDER_HEADERS, order_row
+from notification_scanner import NotificationScanner
+
+
+def test_watch_skips_abandoned_orders():
+    recent = time.strftime("%Y-%m-%d %H:%M:%S")
+    rows = [ORDER_HEADERS]
+    rows += [order_row(f"OLD{i}", "2025-01-01 10:00:00") for i in range(1000)]
+    rows += [order_row("OLDPAID", "2025-01-01 10:00:00", verified="Yes")]
+    rows += [order_row(f"NEW{i}", recent) for i in range(3)]
+    sheet = FakeWorksheet(rows)
+    scanner = NotificationScanner(max_age=8 * 3600)
+    scanner.scan(sheet)
+    scanner.commit()
+
+    # Verified but unconfirmed orders stay watched whatever their age; abandoned ones don't
+    assert sorted(scanner.watch.values()) == ["NEW0", "NEW1", "NEW2", "OLDPAID"]
+
+    sheet.staff_verify(3)  # an old order verified late is not re-read by itself...
+    sheet.append_row(order_row("NEW3", recent))
+    _, candidates = scanner.scan(sheet)
+    assert [row[0] for _, row in candidates] == ["OLDPAID", "NEW0", "NEW1", "NEW2", "NEW3"]
+    assert sheet.calls["batch_get"] == 1
+    scanner.commit()
+
+    # ...until the order store reports it verified, even though the sheet hasn't changed since
+    scanner.rewatch([(3, "OLD1")])
+    _, candidates = scanner.scan(sheet)
+    assert ("OLD1", "Yes") in [(row[0], row[10]) for _, row in candidates]
+    assert sheet.calls["get_all_values"] == 1
+
+
+def test_full_rescan_is_time_based():
+    sheet = FakeWorksheet([ORDER_HEADERS, order_row("OLD0", "2025-01-01 10:00:00")])
+    scanner = NotificationScanner(max_age=8 * 3600, full_scan_interval=900)
+    scanner.scan(sheet)
+    scanner.commit()
+    for _ in range(1000):
+        scanner.scan(sheet)
+    assert sheet.calls["get_all_values"] == 1
+
+    scanner.last_full_scan -= 901
+    scanner.scan(sheet)
+    assert sheet.calls["get_all_values"] == 2
+
+
+def test_unwatched_rows_are_not_read_again():
+    rows = [ORDER_HEADERS] + [order_row(f"PAID{i}", "2025-01-01 10:00:00", verified="Yes") for i in range(500)]
+    sheet = FakeWorksheet(rows)
+    scanner = NotificationScanner(max_age=8 * 3600)
+    _, candidates = scanner.scan(sheet)
+    scanner.unwatch([sheet_row for sheet_row, _ in candidates])  # all queued in the outbox
+    scanner.commit()
+
+    sheet.append_row(order_row("NEW0", time.strftime("%Y-%m-%d %H:%M:%S")))
+    _, candidates = scanner.scan(sheet)
+    assert [row[0] for _, row in candidates] == ["NEW0"]
+    assert sheet.calls["batch_get"] == 0
@@ -0,0 +1,34 @@
+import threading
+
+from order_ids import OrderIdGenerator, decode_order_id, normalize_order_id
+
+
+def test_ids_are_unique_and_time_ordered_across_workers(tmp_path):
+    workers = [OrderIdGenerator(str(tmp_path)) for _ in range(4)]
+    ids = []
+    lock = threading.Lock()
+
+    def issue(generator):
+        batch = [generator.next_id() for _ in range(2000)]
+        assert batch == sorted(batch)  # one worker's IDs sort in issue order
+        with lock: ids.extend(batch)
+
+    threads = [threading.Thread(target=issue, args=(g,)) for g in workers]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(set(ids)) == len(ids) == 8000
+    assert len({g.node for g in workers}) == 4
+
+
+def test_typed_lookalikes_find_the_order(tmp_path):
+    order_id = OrderIdGenerator(str(tmp_path)).next_id()
+    assert not set(order_id[2:]) & set("ILOU")
+    typed = "#" + order_id.lower().replace("0", "o").replace("1", "l")
+    assert normalize_order_id(typed) == order_id
+    assert decode_order_id(typed) == decode_order_id(order_id)
+
+
+def test_hand_made_ids_are_kept_as_typed():
+    assert normalize_order_id(" #pm-1234 ") == "pm-1234"
+    assert normalize_order_id("idea-for-you") == "idea-for-you"
+    assert decode_order_id("pm-1234") is None
@@ -0,0 +1,94 @@
+import time
+
+from fake_sheet import FakeWorksheet, ORDER_HEADERS, order_row
+from order_store import SQLiteOrderStore, SheetMirror
+
+
+def mirrored_store(tmp_path, order_ids):
+    store = SQLiteOrderStore(str(tmp_path / "orders.db"))
+    mirror = SheetMirror(store)
+    sheet = FakeWorksheet()
+    mirror.pull(sheet)
+    for order_id in order_ids:
+        store.add_order(order_id, [order_row(order_id)])
+    mirror.push(sheet.append_rows)
+    mirror.pull(sheet)
+    return store, mirror, sheet
+
+
+def verified(store, order_id):
+    return store.get_order(order_id)["Payment Verified"]
+
+
+def test_deleted_row_does_not_shift_verification(tmp_path):
+    store, mirror, sheet = mirrored_store(tmp_path, ["IDA", "IDB", "IDC"])
+    del sheet.rows[1]  # staff delete IDA's row
+    store.add_order("IDD", [order_row("IDD")])
+    mirror.push(sheet.append_rows)
+    sheet.staff_verify(len(sheet.rows))  # IDD's row
+    mirror.pull(sheet)
+
+    assert verified(store, "IDC") == "No"
+    assert verified(store, "IDD") == "Yes"
+    sheet.staff_verify(2)  # IDB, now on row 2
+    mirror.pull(sheet)
+    assert verified(store, "IDB") == "Yes"
+    assert verified(store, "IDC") == "No"
+
+
+def test_sorted_rows_are_matched_by_order_id(tmp_path):
+    store, mirror, sheet = mirrored_store(tmp_path, ["IDA", "IDB", "IDC"])
+    sheet.rows[1:] = sorted(sheet.rows[1:], reverse=True)  # IDC, IDB, IDA
+    sheet.staff_verify(2)
+    mirror.pull(sheet)
+
+    assert verified(store, "IDC") == "Yes"
+    assert verified(store, "IDA") == "No"
+    assert verified(store, "IDB") == "No"
+    assert store.order_count() == 3
+
+
+def test_staff_rows_and_edits_are_pulled(tmp_path):
+    store, mirror, sheet = mirrored_store(tmp_path, ["IDA"])
+    sheet.append_row(order_row("IDX", verified="Yes"))
+    sheet.staff_verify(2)
+    mirror.pull(sheet)
+
+    assert verified(store, "IDA") == "Yes"
+    assert verified(store, "IDX") == "Yes"
+    assert sheet.rows[0] == ORDER_HEADERS
+
+
+def test_workers_sharing_a_store_take_turns_pulling(tmp_path):
+    store, mirror, sheet = mirrored_store(tmp_path, ["IDA"])
+    other_worker = SheetMirror(SQLiteOrderStore(str(tmp_path / "orders.db")))
+    assert not mirror.claim_pull()  # mirrored_store just pulled
+    assert not other_worker.claim_pull()
+
+    store.set_meta("last_pull", 0)
+    assert other_worker.claim_pull()
+    assert not mirror.claim_pull()
+
+
+def test_pulled_history_is_not_awaiting_verification(tmp_path):
+    sheet = FakeWorksheet()
+    sheet.append_rows([order_row(f"PM-{i}") for i in range(1000)])  # abandoned 2025 orders
+    sheet.append_row(order_row("PM-NEW", order_date=time.strftime("%Y-%m-%d %H:%M:%S")))
+    store = SQLiteOrderStore(str(tmp_path / "orders.db"))
+    SheetMirror(store).pull(sheet)
+
+    assert store.awaiting_verification(time.time() - 8 * 3600) == 1
+
+
+def test_verified_since_reports_old_orders_verified_late(tmp_path):
+    sheet = FakeWorksheet()
+    sheet.append_rows([order_row("PM-OLD"), order_row("PM-PAID", verified="Yes")])
+    store = SQLiteOrderStore(str(tmp_path / "orders.db"))
+    mirror = SheetMirror(store)
+    mirror.pull(sheet)
+    before = time.time()
+    sheet.staff_verify(2)
+    mirror.pull(sheet)
+
+    assert store.verified_since(before, time.time() - 8 * 3600) == [(2, "PM-OLD")]
+    assert store.verified_since(time.time() + 1, time.time()) == []
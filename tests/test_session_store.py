@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from session_store import MemorySessionStore, SessionStore, SQLiteSessionStore
+
+
+def test_memory_store_tracks_bytes_without_reserializing():
+    store = MemorySessionStore(max_sessions=2)
+    sessions = [{"state": "START", "cart": [{"qty": i}] * i} for i in range(3)]
+    for i, session in enumerate(sessions):
+        store.save(f"user{i}", session)
+    sessions[2]["state"] = "CHECKOUT"
+    store.save("user2", sessions[2])
+    store.delete("user1")
+
+    assert store.counters()["evictions"]["lru"] == 1
+    assert store.stats()["approx_bytes"] == len(json.dumps(sessions[2]))
+
+
+def test_backends_implement_the_interface(tmp_path):
+    with pytest.raises(TypeError):
+        SessionStore()
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    store.get("nobody")
+    assert store.counters() == {"evictions": {"ttl": 0, "lru": 0}, "hits": 0, "misses": 1}
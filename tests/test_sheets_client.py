@@ -0,0 +1,61 @@
+import pytest
+
+import sheets_client
+from fake_sheet import FakeWorksheet, quota_error
+from sheets_client import ManagedWorksheet, SheetsClient
+
+
+def server_error():
+    error = quota_error()
+    error.response.status_code = 503
+    return error
+
+
+class FlakyWorksheet(FakeWorksheet):
+    """Raises the queued errors, one per call, before behaving normally."""
+
+    def __init__(self, errors):
+        super().__init__()
+        self.pending_errors = list(errors)
+
+    def _call(self, name):
+        super()._call(name)
+        if self.pending_errors: raise self.pending_errors.pop(0)
+
+
+@pytest.fixture
+def managed(monkeypatch):
+    monkeypatch.setattr(sheets_client.time, "sleep", lambda s: None)
+    client = SheetsClient.__new__(SheetsClient)
+    client.max_retries, client.max_backoff = 5, 32
+    client.stats = {"calls": 0, "retries": 0, "refreshes": 0}
+    client.ensure_token = lambda: None
+    return lambda sheet: ManagedWorksheet(client, sheet)
+
+
+def test_reads_are_retried_on_server_errors(managed):
+    sheet = FlakyWorksheet([server_error(), server_error()])
+    assert managed(sheet).get_all_values() == sheet.rows
+    assert sheet.calls["get_all_values"] == 3
+
+
+def test_appends_are_not_retried_on_server_errors(managed):
+    sheet = FlakyWorksheet([server_error()])
+    with pytest.raises(Exception):
+        managed(sheet).append_rows([["IDA"]])
+    assert sheet.calls["append_rows"] == 1
+
+
+def test_writes_are_retried_on_quota_errors(managed):
+    sheet = FlakyWorksheet([quota_error()])
+    managed(sheet).append_rows([["IDA"]])
+    assert sheet.calls["append_rows"] == 2
+    assert sheet.rows[1:] == [["IDA"]]
+
+
+def test_request_path_uses_a_smaller_retry_budget(managed):
+    sheet = FlakyWorksheet([quota_error()] * 3)
+    with pytest.raises(Exception):
+        managed(sheet).with_retries(1).get_all_values()
+    assert sheet.calls["get_all_values"] == 2
+    assert managed(sheet).get_all_values() == sheet.rows
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails are skipped; previews fall back to the original
+    Image = None
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+CHUNK_SIZE = 64 * 1024
+THUMB_SIZE = (480, 480)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadStore:
+    """Content-addressed image storage for /upload.
+
+    Uploads are copied to disk in chunks while being hashed and counted; the
+    copy aborts as soon as max_bytes is exceeded. Files are named by their
+    SHA-256, so the same image uploaded twice is stored once. A background
+    thread writes a small JPEG preview into thumbs/ for the chat bubble.
+    """
+
+    def __init__(self, upload_dir, max_bytes=10 * 1024 * 1024):
+        self.upload_dir = upload_dir
+        self.thumb_dir = os.path.join(upload_dir, "thumbs")
+        self.max_bytes = max_bytes
+        self.thumb_queue = queue.Queue()
+        self.thumb_thread = None
+        self.lock = threading.Lock()
+
+    def save(self, stream, original_name):
+        """Stores the upload; returns (filename, bytes_written, duplicate)."""
+        ext = os.path.splitext(original_name)[1].lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type '{ext or original_name}'")
+
+        os.makedirs(self.upload_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk: break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f"File exceeds {self.max_bytes // (1024 * 1024)} MB limit")
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            filename = digest.hexdigest()[:32] + ext
+            final_path = os.path.join(self.upload_dir, filename)
+            duplicate = os.path.exists(final_path)
+            if duplicate:
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+        if not duplicate or not os.path.exists(self.thumb_path(filename)):
+            self.queue_thumbnail(filename)
+        return filename, size, duplicate
+
+    def thumb_path(self, filename):
+        return os.path.join(self.thumb_dir, os.path.splitext(filename)[0] + ".jpg")
+
+    def preview_path(self, filename):
+        """Thumbnail if it has been generated, else the original."""
+        thumb = self.thumb_path(filename)
+        return thumb if os.path.exists(thumb) else os.path.join(self.upload_dir, filename)
+
+    def queue_thumbnail(self, filename):
+        if Image is None: return
+        with self.lock:
+            if self.thumb_thread is None:
+                self.thumb_thread = threading.Thread(target=self._thumbnail_worker, daemon=True)
+                self.thumb_thread.start()
+        self.thumb_queue.put(filename)
+
+    def _thumbnail_worker(self):
+        while True:
+            filename = self.thumb_queue.get()
+            try:
+                self.make_thumbnail(filename)
+            except Exception as e:
+                print(f"[ERROR]: Thumbnail failed for {filename}: {e}")
+
+    def make_thumbnail(self, filename):
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        target = self.thumb_path(filename)
+        with Image.open(os.path.join(self.upload_dir, filename)) as img:
+            img.draft("RGB", THUMB_SIZE)  # lets JPEG decode at reduced scale
+            img = img.convert("RGB")
+            img.thumbnail(THUMB_SIZE)
+            tmp = target + ".part"
+            img.save(tmp, "JPEG", quality=80, optimize=True)
+        os.replace(tmp, target)
@@ -1,57 +1,224 @@
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, send_file, send_from_directory, abort, Response, g
 from flask_cors import CORS
 import re
+import hmac
 import json
+import math
 import os
 import threading
 import time
-import random
 from datetime import datetime
 
+from order_store import SQLiteOrderStore, SheetMirror, default_store_path
+from notification_scanner import NotificationScanner, coalesce_rows
+from sheet_columns import CONF_SENT_COLS, ORDER_ID_COLS, PHONE_COLS, VERIFIED_COLS, record_value, require_col
+from notification_outbox import SQLiteOutbox
+from notification_dispatcher import NotificationDispatcher, create_transport
+from leader_lock import LeaderLock
+from session_store import create_session_store
+from order_ids import OrderIdGenerator, normalize_order_id
+from intent_matcher import IntentMatcher
+from conversation_flow import FLOW, validate_flow
+from upload_store import UploadStore, UploadTooLarge
+from sheets_client import SheetsClient, SCOPES
+from catalog import Catalog
+from reply_templates import StaticReply, ReplyTemplate, response_body
+from metrics import Registry, SIZE_BUCKETS
+from sampling_profiler import SamplingProfiler
+from rate_limit import TokenBucketLimiter, client_ip
+from single_flight import SingleFlight
+from poll_scheduler import AdaptivePoller
+
 # Define Base Directory for robust path finding
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_STARTED = time.perf_counter()
+
+# Per-process metrics, served at /metrics
+METRICS = Registry()
+MESSAGE_SECONDS = METRICS.histogram("bot_message_seconds", "handle_message duration by conversation state and IDLE intent", ("state", "intent"))
+SHEETS_SECONDS = METRICS.histogram("bot_sheets_call_seconds", "Google Sheets call duration by operation", ("op",))
+SHEETS_ERRORS = METRICS.counter("bot_sheets_errors_total", "Google Sheets calls that raised, by operation", ("op",))
+ORDER_STORE_SECONDS = METRICS.histogram("bot_order_store_seconds", "Local order store operation duration", ("op",))
+NOTIFICATIONS_QUEUED = METRICS.counter("bot_notifications_queued_total", "Payment confirmations found and queued for sending")
+HTTP_SECONDS = METRICS.histogram("bot_http_request_seconds", "HTTP request duration by route and status", ("route", "status"))
+UPLOAD_BYTES = METRICS.histogram("bot_upload_bytes", "Size of accepted uploads", buckets=SIZE_BUCKETS)
+UPLOAD_SECONDS = METRICS.histogram("bot_upload_seconds", "Time to stream an upload to disk")
+UPLOADS = METRICS.counter("bot_uploads_total", "Upload attempts by result", ("result",))
+RATE_LIMITED = METRICS.counter("bot_rate_limited_total", "Requests refused by the rate limiter, by route and limit", ("route", "limit"))
+
+# Token buckets (requests per minute; bursts up to a sixth of that, at least 5)
+RATE_LIMIT_USER = TokenBucketLimiter(int(os.environ.get("RATE_LIMIT_USER_PER_MIN", 60)))
+RATE_LIMIT_IP = TokenBucketLimiter(int(os.environ.get("RATE_LIMIT_IP_PER_MIN", 240)))
+RATE_LIMIT_UPLOAD = TokenBucketLimiter(int(os.environ.get("RATE_LIMIT_UPLOAD_PER_MIN", 10)))
+# Reverse proxies in front of the app (Render has one); used to find the client IP in X-Forwarded-For
+PROXY_HOPS = int(os.environ.get("PROXY_HOPS", 1))
+# Sheets retries for calls made inside a /chat request; background threads keep the client's long backoff
+REQUEST_SHEET_RETRIES = 1
+
+
+def chat_retry_after(user_id, ip):
+    """Seconds until this user/IP may send another /chat message, or 0 if it may now."""
+    wait = RATE_LIMIT_IP.allow(ip)
+    if wait:
+        RATE_LIMITED.inc("/chat", "ip")
+        return wait
+    wait = RATE_LIMIT_USER.allow(user_id)
+    if wait: RATE_LIMITED.inc("/chat", "user")
+    return wait
 
 class IDecorBot:
-    def __init__(self, sheet_name="PosterMan Orders", creds_file="credentials.json"):
+    def __init__(self, sheet_name="PosterMan Orders", creds_file="credentials.json", connect=True):
         self.sheet_name = sheet_name
         self.creds_file = os.path.join(BASE_DIR, creds_file)
-        self.user_sessions = {}
+        self.user_sessions = create_session_store()
         self.sheet = None
-        self.products = []
-        self.load_products()
-        self.connect_gsheet()
+        self.sheets_client = None
+        # Sheet readiness: "connecting" -> "ready" | "unavailable" (see connect_in_background)
+        self.sheet_status = "unavailable"
+        self.sheet_ready = threading.Event()
+        self.connect_seconds = None
+        self.connect_thread = None
+        self.connect_lock = threading.Lock()
+        self.last_connect_attempt = 0
+        # Orders live in local SQLite; the sheet is an eventually consistent mirror
+        self.orders = SQLiteOrderStore(default_store_path(BASE_DIR))
+        self.mirror = SheetMirror(self.orders)
+        # Payments are verified within ~7 hours; older unverified orders are treated as abandoned
+        self.awaiting_window = float(os.environ.get("NOTIFY_AWAITING_HOURS", 8)) * 3600
+        self.notification_scanner = NotificationScanner(max_age=self.awaiting_window)
+        self.verified_checked = time.time()
+        # Confirmation messages go through a durable outbox; 'Confirmation Sent' is written after delivery
+        self.outbox = SQLiteOutbox(default_store_path(BASE_DIR))
+        self.dispatcher = NotificationDispatcher(
+            self.outbox, create_transport(),
+            workers=int(os.environ.get("NOTIFY_WORKERS", 4)),
+            batch_size=int(os.environ.get("NOTIFY_BATCH_SIZE", 50)),
+        )
+        self.poller = AdaptivePoller(
+            fast=float(os.environ.get("NOTIFY_POLL_FAST", 5)),
+            idle=float(os.environ.get("NOTIFY_POLL_IDLE", 120)),
+        )
+        self.order_ids = OrderIdGenerator()
+        # Concurrent lookups of one order ID (and concurrent miss pulls) share a single backend fetch
+        self.inflight = SingleFlight()
+        self.intents = IntentMatcher.from_file(os.path.join(BASE_DIR, "intents.json"))
+        # Per-thread facts about the message being handled (the IDLE intent, for metrics)
+        self.turn = threading.local()
+
+        # State -> handler; dispatch in _handle_message is a single dict lookup
+        self.state_handlers = {
+            "IDLE": self.on_idle,
+            "CHECK_STATUS": self.on_check_status,
+            "ASK_ORDER_CATEGORY": self.on_ask_order_category,
+            "WEBSITE_SELECT_PRODUCT": self.on_website_select_product,
+            "WEBSITE_ASK_QTY": self.on_ask_qty,
+            "CUSTOM_UPLOAD_DETAILS": self.on_custom_upload_details,
+            "CUSTOM_ASK_QTY": self.on_ask_qty,
+            "ASK_ADD_MORE": self.on_ask_add_more,
+            "ASK_NAME": self.on_ask_name,
+            "ASK_ADDRESS": self.on_ask_address,
+            "ASK_PHONE": self.on_ask_phone,
+        }
+        validate_flow(FLOW, self.state_handlers)
+        self.last_flush = {"cells": 0, "seconds": 0.0}
+        self.catalog = Catalog(os.path.join(BASE_DIR, "products.json"))
+        if connect:
+            self.connect_in_background()
         
         # Identity & Tone
         self.BOT_NAME = "PosterBot"
         self.WHATSAPP_LINK = "https://wa.me/919876543210" # Placeholder number
         
-        self.WELCOME_MESSAGE = {
-            "text": (
+        # Fixed replies are StaticReply (serialized once for /chat); ones with
+        # fields are ReplyTemplate. Neither may be mutated after this point.
+        self.WELCOME_MESSAGE = StaticReply(
+            (
                 "Welcome to PosterMan! 🎨\n"
                 "I'm PosterBot, your personal art curator.\n"
                 "Looking for some museum-grade art for your walls today?"
             ),
-            "options": ["🛒 Place an order", "📦 Track Order", "✨ Custom Print", "🦸 Anime Collection"]
-        }
+            ["🛒 Place an order", "📦 Track Order", "✨ Custom Print", "🦸 Anime Collection"]
+        )
         
         # Responses
-        self.FAQ_MESSAGE = {
-            "text": "Please note: PosterMan does not offer replacement. Courier damage is not refundable.",
-            "options": ["🔙 Main Menu"]
-        }
+        self.FAQ_MESSAGE = StaticReply(
+            "Please note: PosterMan does not offer replacement. Courier damage is not refundable.",
+            ["🔙 Main Menu"]
+        )
 
-        self.POLICIES_MESSAGE = {
-            "text": (
+        self.POLICIES_MESSAGE = StaticReply(
+            (
                 "📜 **PosterMan Policies**\n\n"
                 "• **Shipping**: Free Shipping over ₹999. Dispatched within 24-48 hours.\n"
                 "• **Returns**: We offer Free Replacements for damage during transit (video proof required).\n"
                 "• **Refunds**: Issued only after verification.\n"
                 "• **Note**: Custom orders cannot be cancelled once confirmed."
             ),
-            "options": ["🔙 Main Menu"]
+            ["🔙 Main Menu"]
+        )
+
+        self.MORE_PRODUCTS_OPTION = "➡️ More products"
+
+        self.WARMING_UP_MESSAGE = StaticReply(
+            "⏳ We're still warming up. Please send that again in a few seconds.",
+            ["🔙 Main Menu"]
+        )
+
+        self.RATE_LIMITED_MESSAGE = StaticReply(
+            "⏳ You're sending messages too quickly. Please wait a moment and try again.", ["🔙 Main Menu"]
+        )
+
+        self.NOT_CONNECTED_MESSAGE = StaticReply("System Error: Database not connected.", ["🔙 Main Menu"])
+        self.ORDER_NOT_FOUND_MESSAGE = StaticReply("Order ID not found.", ["🔙 Main Menu", "Use Check Status Again"])
+        self.ORDER_LOOKUP_FAILED_MESSAGE = StaticReply("Order ID not found.", ["🔙 Main Menu"])
+        self.ORDER_CONFIRMED_TEMPLATE = ReplyTemplate("Order #{order_id}: Confirmed ✅", ["🔙 Main Menu"])
+        self.ORDER_PENDING_TEMPLATE = ReplyTemplate("Order #{order_id}: Payment Pending ⏳", ["🔙 Main Menu"])
+
+        self.TRACK_ORDER_MESSAGE = StaticReply(
+            "Sure! Please enter your **Order ID** (e.g., #ID02MB3WCRG00) to check status.", ["🔙 Main Menu"]
+        )
+        offer_text = "🔥 **Admin Tip**: Buy 2 Get 10% Off!"
+        self.COLLECTION_MESSAGES = {
+            category: StaticReply(
+                f"Welcome to the Otaku Zone! Check out our {category.capitalize()} collection.\n{offer_text}\n\n[View Collection](/products.html?cat={category})",
+                ["🛒 Place an order", "✨ Custom Print"]
+            )
+            for category in ("all", "anime", "marvel", "cars")
         }
+        self.CUSTOM_IMAGE_RECEIVED_MESSAGE = StaticReply(
+            "Wow, great shot! 📸 I've received your image. How many copies do you need?", ["1", "2", "3", "5"]
+        )
+        self.CUSTOM_PRINT_MESSAGE = StaticReply(
+            "Finding your masterpiece? We use **240gsm premium paper** for custom prints! 🖼️\n\nUpload your art by clicking the 📎 icon below.",
+            ["🔙 Main Menu"]
+        )
+        self.CHECKOUT_MESSAGE = StaticReply("Ready to own your art? 🛒\n\n[Proceed to Checkout](/checkout.html)", ["🔙 Main Menu"])
+        self.WHATSAPP_MESSAGE = StaticReply(
+            f"Click here to chat with our expert: [Open WhatsApp]({self.WHATSAPP_LINK})", ["🔙 Main Menu"]
+        )
+        self.ORDER_CATEGORY_MESSAGE = StaticReply("What would you like to order?", ["Website Product", "Custom Product"])
+        self.ORDER_CATEGORY_RETRY_MESSAGE = StaticReply("Please choose:", ["Website Product", "Custom Product"])
+        self.CUSTOM_DETAILS_MESSAGE = StaticReply(
+            "For custom products, please describe/upload details here.", ["I have uploaded details", "🔙 Main Menu"]
+        )
+        self.HUMAN_HANDOFF_MESSAGE = StaticReply(
+            "I'm having trouble finding that. Would you like to chat with a human expert on WhatsApp?",
+            ["Chat on WhatsApp", "🔙 Main Menu"]
+        )
+        self.FALLBACK_MESSAGE = StaticReply("I didn't quite catch that. Could you rephrase? 🤔", self.WELCOME_MESSAGE["options"])
+
+        self.PRODUCT_SELECTED_TEMPLATE = ReplyTemplate("Selected '{product}'. Quantity?", ["1", "2", "3"])
+        self.ADD_MORE_MESSAGE = StaticReply("Added to cart. Add more?", ["Yes", "No, Checkout"])
+        self.CUSTOM_QTY_MESSAGE = StaticReply("Got it. Quantity?", ["1", "2", "3"])
+        self.CATEGORY_AGAIN_MESSAGE = StaticReply("Category?", ["Website Product", "Custom Product"])
+        self.ASK_NAME_MESSAGE = StaticReply("Please enter your Full Name:", [])
+        self.ASK_ADDRESS_MESSAGE = StaticReply("Please enter your Full Address:", [])
+        self.ASK_PHONE_MESSAGE = StaticReply("Please enter your 10-digit Mobile Number:", [])
+        self.INVALID_PHONE_MESSAGE = StaticReply("⚠️ Invalid number. Please enter exactly 10 digits:", [])
+        self.ORDER_SAVE_FAILED_MESSAGE = StaticReply(
+            "⚠️ System Error: Could not save order. Please try again later.", ["Main Menu"]
+        )
 
         self.PAYMENT_QR_MESSAGE = (
             "Please scan the QR code below to complete payment 💳\n"
@@ -59,94 +226,120 @@ class IDecorBot:
             "You will receive a confirmation message after verification."
         )
 
-    def load_products(self):
-        try:
-            p_path = os.path.join(BASE_DIR, "products.json")
-            if os.path.exists(p_path):
-                with open(p_path, "r") as f:
-                    self.products = json.load(f)
-            else:
-                self.products = []
-        except Exception as e:
-            print(f"Error loading products: {e}")
-            self.products = []
-
     def connect_gsheet(self):
         """Connects to Google Sheets using the service account (File or Env Var)."""
         try:
-            scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-            creds = None
-            
-            # 1. Try Environment Variable (Best for Render/Heroku)
-            def clean_key(key):
-                key = key.strip().strip('"').strip("'")
-                key = key.replace('\\n', '\n')
-                key = key.replace('\\\\n', '\n')
-                return key
-
-            json_creds = os.environ.get("GOOGLE_CREDENTIALS")
-            if json_creds and json_creds.strip():
-                try:
-                    creds_dict = json.loads(json_creds)
-                    if 'private_key' in creds_dict:
-                        raw_key = creds_dict['private_key']
-                        creds_dict['private_key'] = clean_key(raw_key) 
-                    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-                except Exception as e:
-                    print(f"[ERROR] Failed to load credentials from Env. Error: {e}")
-            
-            # 2. Try Local File (Fallback)
-            if not creds:
-                if os.path.exists(self.creds_file):
-                    try:
-                        with open(self.creds_file, 'r') as f:
-                            file_creds = json.load(f)
-                        if 'private_key' in file_creds:
-                             file_creds['private_key'] = clean_key(file_creds['private_key'])
-                        creds = ServiceAccountCredentials.from_json_keyfile_dict(file_creds, scope)
-                    except Exception as e:
-                         print(f"[ERROR] Fallback file loading failed: {e}")
-                else:
-                    return
+            # The pooled client (and its token) is built once and reused on reconnects
+            if not self.sheets_client:
+                self.sheets_client = self.load_sheets_client()
+                if not self.sheets_client: return
 
-            client = gspread.authorize(creds)
             try:
-                self.sheet = client.open(self.sheet_name).sheet1
+                self.sheet = self.sheets_client.open_worksheet(self.sheet_name)
                 print("[SYSTEM]: Connected to Google Sheet successfully.")
+                try:
+                    # Skipped if another worker sharing the order store has just pulled
+                    if self.mirror.claim_pull():
+                        synced = self.mirror.pull(self.sheet)
+                        print(f"[SYSTEM]: Synced {synced} sheet rows into the order store.")
+                except Exception as e:
+                    print(f"[ERROR]: Could not sync orders from the sheet: {e}")
             except gspread.exceptions.SpreadsheetNotFound:
                 print(f"[ERROR]: Sheet '{self.sheet_name}' not found.")
             
         except Exception as e:
             print(f"[ERROR]: Could not connect to Google Sheets: {e}")
 
+    def load_sheets_client(self):
+        """Builds a SheetsClient from GOOGLE_CREDENTIALS or the credentials file; None if neither works."""
+        creds = None
+
+        # 1. Try Environment Variable (Best for Render/Heroku)
+        def clean_key(key):
+            key = key.strip().strip('"').strip("'")
+            key = key.replace('\\n', '\n')
+            key = key.replace('\\\\n', '\n')
+            return key
+
+        json_creds = os.environ.get("GOOGLE_CREDENTIALS")
+        if json_creds and json_creds.strip():
+            try:
+                creds_dict = json.loads(json_creds)
+                if 'private_key' in creds_dict:
+                    raw_key = creds_dict['private_key']
+                    creds_dict['private_key'] = clean_key(raw_key) 
+                creds = SheetsClient(creds_dict, SCOPES)
+            except Exception as e:
+                print(f"[ERROR] Failed to load credentials from Env. Error: {e}")
+        
+        # 2. Try Local File (Fallback)
+        if not creds:
+            if os.path.exists(self.creds_file):
+                try:
+                    with open(self.creds_file, 'r') as f:
+                        file_creds = json.load(f)
+                    if 'private_key' in file_creds:
+                         file_creds['private_key'] = clean_key(file_creds['private_key'])
+                    creds = SheetsClient(file_creds, SCOPES)
+                except Exception as e:
+                     print(f"[ERROR] Fallback file loading failed: {e}")
+        return creds
+
+    def connect_in_background(self, min_interval=0):
+        """Runs connect_gsheet on a thread so startup and requests never wait on Google."""
+        with self.connect_lock:
+            if self.connect_thread and self.connect_thread.is_alive(): return
+            if time.time() - self.last_connect_attempt < min_interval: return
+            self.last_connect_attempt = time.time()
+            self.sheet_status = "connecting"
+            self.sheet_ready.clear()
+            self.connect_thread = threading.Thread(target=self._connect_worker, daemon=True)
+            self.connect_thread.start()
+
+    def _connect_worker(self):
+        start_time = time.perf_counter()
+        self.connect_gsheet()
+        self.connect_seconds = time.perf_counter() - start_time
+        self.sheet_status = "ready" if self.sheet else "unavailable"
+        self.sheet_ready.set()
+        print(f"[SYSTEM]: Google Sheet {self.sheet_status} after {self.connect_seconds:.2f}s.")
+
     def generate_order_id(self):
-        return f"ID{random.randint(1000, 9999)}"
+        return self.order_ids.next_id()
 
     def get_order_status(self, order_id):
-        if not self.sheet:
-            self.connect_gsheet()
-            if not self.sheet: return {"text": "System Error: Database not connected.", "options": ["🔙 Main Menu"]}
+        return self.inflight.do(("status", order_id), self._get_order_status, order_id)
 
+    def _get_order_status(self, order_id):
         try:
-            records = self.sheet.get_all_records()
-            for row in records:
-                if str(row.get('Order ID', '')) == str(order_id):
-                    verified = str(row.get('Payment Verified', '') or row.get('- Payment Verified', '')).strip().lower()
-                    if verified == 'yes':
-                        return {"text": f"Order #{order_id}: Confirmed ✅", "options": ["🔙 Main Menu"]}
-                    else:
-                        return {"text": f"Order #{order_id}: Payment Pending ⏳", "options": ["🔙 Main Menu"]}
-            return {"text": "Order ID not found.", "options": ["🔙 Main Menu", "Use Check Status Again"]}
+            with ORDER_STORE_SECONDS.time("get_order"):
+                row = self.orders.get_order(order_id)
+            if row is None:
+                # Not in the local store: only the sheet can tell us more
+                if not self.sheet:
+                    if self.sheet_status == "connecting": return self.WARMING_UP_MESSAGE
+                    self.connect_in_background(min_interval=30)
+                    return self.NOT_CONNECTED_MESSAGE
+                if self.mirror.should_pull_on_miss(order_id):
+                    # Possibly typed into the sheet by staff; one bounded pull on miss
+                    with SHEETS_SECONDS.time("lookup_pull", errors=SHEETS_ERRORS):
+                        self.inflight.do("miss_pull", self.mirror.pull, self.request_sheet())
+                    row = self.orders.get_order(order_id)
+
+            if row is not None:
+                verified = str(record_value(row, VERIFIED_COLS)).strip().lower()
+                if verified == 'yes':
+                    return self.ORDER_CONFIRMED_TEMPLATE.render(order_id=order_id)
+                else:
+                    return self.ORDER_PENDING_TEMPLATE.render(order_id=order_id)
+            return self.ORDER_NOT_FOUND_MESSAGE
         except Exception as e:
             print(f"Error fetching status: {e}")
             pass
-        return {"text": "Order ID not found.", "options": ["🔙 Main Menu"]}
+        return self.ORDER_LOOKUP_FAILED_MESSAGE
 
     def save_order_batch(self, session_data):
-        if not self.sheet:
-            self.connect_gsheet()
-            if not self.sheet: return False
-
+        # Stored locally and acknowledged immediately; order_mirror pushes it to the sheet
         try:
             order_id = self.generate_order_id()
             cart = session_data.get('cart', [])
@@ -171,254 +364,341 @@ class IDecorBot:
                     'No'
                 ]
                 rows_to_add.append(row)
-            
-            # Using append_rows if available in gspread version, else loop append_row
+
+            with ORDER_STORE_SECONDS.time("add_order"):
+                self.orders.add_order(order_id, rows_to_add)
+            self.mirror.wakeup.set()
+            # Switch the notification monitor to fast polling now rather than after its idle sleep
+            self.poller.trigger()
+            return order_id
+        except Exception as e:
+            print(f"Error saving order: {e}")
+            return None
+
+    def request_sheet(self):
+        """self.sheet with a retry budget of REQUEST_SHEET_RETRIES, so a quota storm can't hold a worker for a minute."""
+        with_retries = getattr(self.sheet, "with_retries", None)
+        return with_retries(REQUEST_SHEET_RETRIES) if with_retries else self.sheet
+
+    def write_order_rows(self, rows_to_add):
+        if not self.sheet:
+            self.connect_in_background(min_interval=30)
+            raise ConnectionError("Database not connected")
+
+        # Using append_rows if available in gspread version, else loop append_row
+        with SHEETS_SECONDS.time("append_rows", errors=SHEETS_ERRORS):
             try:
                 self.sheet.append_rows(rows_to_add)
             except AttributeError:
                 for r in rows_to_add:
                     self.sheet.append_row(r)
-            
-            return order_id
-        except Exception as e:
-            print(f"Error saving order: {e}")
-            return None
 
     def check_for_notifications(self):
-        if not self.sheet: return []
-        notifications = []
-        try:
-            rows = self.sheet.get_all_values()
-            if len(rows) < 2: return []
-            headers = rows[0]
-            
-            def find_col(possible_names):
-                for name in possible_names:
-                    if name in headers: return headers.index(name)
-                raise ValueError
-            
-            try:
-                idx_verified = find_col(['Payment Verified', '- Payment Verified'])
-                idx_conf_sent = find_col(['Confirmation Sent', '- Confirmation Sent'])
-                idx_order_id = find_col(['Order ID', '- Order ID'])
-                idx_phone = find_col(['Contact no.', '- Contact no.'])
-            except:
-                return []
-
-            for i in range(1, len(rows)):
-                row_data = rows[i]
-                if len(row_data) <= max(idx_verified, idx_conf_sent): continue
-
-                payment_verified = row_data[idx_verified].strip().lower()
-                conf_sent = row_data[idx_conf_sent].strip().lower()
-                
-                if payment_verified == 'yes' and conf_sent != 'yes':
-                    order_id = row_data[idx_order_id]
-                    phone = row_data[idx_phone]
-                    notifications.append((phone, f"Your order #{order_id} is Confirmed! ✅"))
-                    self.sheet.update_cell(i + 1, idx_conf_sent + 1, 'Yes')
-        except:
-            pass
-        return notifications
+        """Queues a confirmation per newly verified order; returns how many (sheet errors propagate)."""
+        if not self.sheet: return 0
+        orders = {}   # order id -> (phone, message, sheet rows)
+
+        # Abandoned orders the scanner stopped watching come back once the order mirror pulls their verification
+        checked = time.time()
+        self.notification_scanner.rewatch(
+            self.orders.verified_since(self.verified_checked, checked - self.awaiting_window)
+        )
+        self.verified_checked = checked
 
-    def get_website_product_options(self):
-        # Simply return names from products.json
-        return [p['name'] for p in self.products] if self.products else ["Generic Website Product"]
+        # Only rows appended or still awaiting confirmation since the last tick
+        with SHEETS_SECONDS.time("notification_scan", errors=SHEETS_ERRORS):
+            headers, candidates = self.notification_scanner.scan(self.sheet)
+        if not headers: return 0
 
-    def handle_message(self, user_phone, message):
-        message = message.strip()
-        msg_lower = message.lower()
+        idx_verified = require_col(headers, VERIFIED_COLS)
+        idx_conf_sent = require_col(headers, CONF_SENT_COLS)
+        idx_order_id = require_col(headers, ORDER_ID_COLS)
+        idx_phone = require_col(headers, PHONE_COLS)
 
+        for sheet_row, row_data in candidates:
+            if len(row_data) <= max(idx_verified, idx_conf_sent): continue
+
+            payment_verified = row_data[idx_verified].strip().lower()
+            conf_sent = row_data[idx_conf_sent].strip().lower()
+
+            if payment_verified == 'yes' and conf_sent != 'yes':
+                order_id = row_data[idx_order_id].strip()
+                # The order ID is the outbox's idempotency key; rows without one can't be tracked
+                if not order_id: continue
+                if order_id not in orders:
+                    phone = row_data[idx_phone]
+                    message = f"Your order #{order_id} is Confirmed! ✅"
+                    orders[order_id] = (phone, message, [])
+                orders[order_id][2].append(sheet_row)
+
+        # Rows of an order already in the outbox are merged into it, never sent twice
+        queued = self.outbox.enqueue([(o, phone, msg, rows) for o, (phone, msg, rows) in orders.items()])
+        # The outbox now holds these rows and marks them after delivery, so the scanner stops re-reading them
+        self.notification_scanner.unwatch([r for _, _, rows in orders.values() for r in rows])
+        self.notification_scanner.commit()
+        NOTIFICATIONS_QUEUED.inc(amount=queued)
+        if orders: self.dispatcher.wakeup.set()
+        return queued
+
+    def confirm_delivered(self, deliveries):
+        """Marks 'Confirmation Sent' for [(order_id, [sheet_row, ...])]; returns the order IDs handled."""
+        if not self.sheet: raise ConnectionError("Google Sheet not connected")
+        headers = self.notification_scanner.headers or self.sheet.row_values(1)
+        idx_conf_sent = require_col(headers, CONF_SENT_COLS)
+        idx_order_id = require_col(headers, ORDER_ID_COLS)
+
+        # Rows may have shifted since the order was queued: only mark rows still holding its Order ID.
+        # Skipped rows are re-queued by the scanner's rescan and marked without a second message.
+        ranges = coalesce_rows(sorted({r for _, rows in deliveries for r in rows}), idx_order_id + 1, idx_order_id + 1)
+        current = {}
+        if ranges:
+            with SHEETS_SECONDS.time("confirm_check", errors=SHEETS_ERRORS):
+                results = self.sheet.batch_get([rng for _, _, rng in ranges])
+            for (start, end, _), values in zip(ranges, results):
+                values = list(values)
+                for sheet_row in range(start, end + 1):
+                    cell = values[sheet_row - start] if sheet_row - start < len(values) else []
+                    current[sheet_row] = cell[0].strip() if cell else ''
+
+        confirmed_rows = [r for order_id, rows in deliveries for r in rows if current.get(r) == order_id]
+        self.flush_confirmations(confirmed_rows, idx_conf_sent + 1)
+        return [order_id for order_id, _ in deliveries]
+
+    def orders_awaiting_verification(self):
+        """Recent orders whose payment staff haven't verified yet; while there are any, notifications poll fast."""
+        return self.orders.awaiting_verification(time.time() - self.awaiting_window)
+
+    def flush_confirmations(self, sheet_rows, col):
+        """Marks 'Confirmation Sent' = Yes for all sheet_rows in a single batch_update call."""
+        if not sheet_rows: return 0
+        start_time = time.time()
+
+        # Coalesce consecutive rows into one range each (e.g. L5:L9)
+        ranges = [
+            {"range": rng, "values": [['Yes']] * (end - start + 1)}
+            for start, end, rng in coalesce_rows(sorted(sheet_rows), col, col)
+        ]
+        with SHEETS_SECONDS.time("confirm_flush", errors=SHEETS_ERRORS):
+            self.sheet.batch_update(ranges)
+        elapsed = time.time() - start_time
+        self.last_flush = {"cells": len(sheet_rows), "seconds": elapsed}
+        print(f"[SYSTEM]: Flushed {len(sheet_rows)} confirmation cells in {elapsed:.3f}s.")
+        return len(sheet_rows)
+
+    def get_website_product_options(self, cursor=None, limit=10):
+        """One page of product names from the catalog, plus the cursor of the next page (or None)."""
+        items, next_cursor = self.catalog.page(cursor, limit)
+        if not items and not cursor:
+            return ["Generic Website Product"], None
+        return [p['name'] for p in items], next_cursor
+
+    def product_page_reply(self, session, cursor=None):
+        opts, next_cursor = self.get_website_product_options(cursor)
+        session["catalog_cursor"] = next_cursor
+        out_opts = list(opts)
+        if next_cursor:
+            out_opts.append(self.MORE_PRODUCTS_OPTION)
+        out_opts.append("🔙 Main Menu")
+        return {"text": "Select a product from our catalog:", "options": out_opts}
+
+    def handle_message(self, user_phone, message):
         # Initialize Session
-        if user_phone not in self.user_sessions:
-            self.user_sessions[user_phone] = {
+        session = self.user_sessions.get(user_phone)
+        if session is None:
+            session = {
                 "state": "IDLE", 
                 "cart": [],
                 "user_info": {"phone": user_phone},
                 "fallback_count": 0
             }
-        
-        session = self.user_sessions[user_phone]
+
+        state = session["state"]
+        start_time = time.perf_counter()
+        # IDLE turns are split by intent, as on_idle matched it ("none" for resets and no match)
+        self.turn.intent = "none" if state == "IDLE" else ""
+        try:
+            return self._handle_message(user_phone, session, message)
+        finally:
+            # Write back so shared stores see this turn's state/cart changes
+            self.user_sessions.save(user_phone, session)
+            MESSAGE_SECONDS.observe(time.perf_counter() - start_time, state, self.turn.intent)
+
+    def _handle_message(self, user_phone, session, message):
+        message = message.strip()
+        msg_lower = message.lower()
         state = session["state"]
 
         # --- 1. Global Resets ---
-        if msg_lower in ["hi", "hello", "hey", "menu", "start", "restart", "main menu", "🔙 main menu"]:
+        if msg_lower in self.intents.resets:
             session["state"] = "IDLE"
             session["fallback_count"] = 0
             return self.WELCOME_MESSAGE
 
-        # --- 2. IDLE State & Keyword Rules ---
-        if state == "IDLE":
-            # Rule #1: Order Tracking
-            if any(w in msg_lower for w in ["track", "order status", "where is my order", "status"]):
-                session["state"] = "CHECK_STATUS"
-                session["fallback_count"] = 0
-                return {"text": "Sure! Please enter your **Order ID** (e.g., #PM-1234) to check status.", "options": ["🔙 Main Menu"]}
-
-            # Rule #2: Product Recommendations
-            if any(w in msg_lower for w in ["anime", "marvel", "cars", "gift", "collection"]):
-                session["fallback_count"] = 0
-                category = "all"
-                if "anime" in msg_lower: category = "anime"
-                elif "marvel" in msg_lower: category = "marvel"
-                elif "cars" in msg_lower: category = "cars"
-                
-                offer_text = "🔥 **Admin Tip**: Buy 2 Get 10% Off!"
-                return {
-                    "text": f"Welcome to the Otaku Zone! Check out our {category.capitalize()} collection.\n{offer_text}\n\n[View Collection](/products.html?cat={category})",
-                    "options": ["🛒 Place an order", "✨ Custom Print"]
-                }
-
-            # Rule #3: Custom Orders
-            if any(w in msg_lower for w in ["custom", "personal", "my own photo", "print", "image uploaded"]):
-                session["fallback_count"] = 0
-                if "[image uploaded]" in msg_lower:
-                    # Direct upload from idle, save as detail
-                    url = message.split("] ")[1] if "] " in message else message
-                    session["current_item"] = {"type": "Custom", "product_name": "Custom Upload", "details": f"Image: {url}"}
-                    session["state"] = "CUSTOM_ASK_QTY"
-                    return {
-                        "text": "Wow, great shot! 📸 I've received your image. How many copies do you need?",
-                        "options": ["1", "2", "3", "5"]
-                    }
-
-                return {
-                    "text": "Finding your masterpiece? We use **240gsm premium paper** for custom prints! 🖼️\n\nUpload your art by clicking the 📎 icon below.",
-                    "options": ["🔙 Main Menu"]
-                }
-
-            # Rule #4: Policies
-            if any(w in msg_lower for w in ["return", "broken", "refund", "shipping", "shipping time", "policy"]):
-                session["fallback_count"] = 0
-                return self.POLICIES_MESSAGE
-
-            # Cart / Checkout
-            if any(w in msg_lower for w in ["checkout", "buy", "cart"]):
-                session["fallback_count"] = 0
-                return {
-                    "text": "Ready to own your art? 🛒\n\n[Proceed to Checkout](/checkout.html)", 
-                    "options": ["🔙 Main Menu"]
-                }
-
-            # Chat on WhatsApp Action
-            if "chat upon whatsapp" in msg_lower or "chat on whatsapp" in msg_lower:
-                 return {
-                     "text": f"Click here to chat with our expert: [Open WhatsApp]({self.WHATSAPP_LINK})",
-                     "options": ["🔙 Main Menu"]
-                 }
-                 
-            # Existing Flow: Place Order
-            if "place an order" in msg_lower or "cart" in msg_lower:
-                session["state"] = "ASK_ORDER_CATEGORY"
-                session["fallback_count"] = 0
-                return {
-                    "text": "What would you like to order?",
-                    "options": ["Website Product", "Custom Product"]
-                }
+        # --- 2. Dispatch to the current state's handler (see conversation_flow.FLOW) ---
+        handler = self.state_handlers.get(state)
+        if handler:
+            response = handler(session, message, msg_lower)
+            if session["state"] not in FLOW[state]:
+                print(f"[WARN]: Unexpected transition {state} -> {session['state']} (not in FLOW).")
+            if response is not None:
+                return response
 
-        # --- 3. State Machine Logic (For Ongoing Flows) ---
-        
-        # CHECK STATUS
-        if state == "CHECK_STATUS":
-            order_id = message.replace("#", "").strip()
-            status = self.get_order_status(order_id)
-            session["state"] = "IDLE"
-            return status
-
-        # ORDER FLOW (Website/Custom)
-        elif state == "ASK_ORDER_CATEGORY":
-            if "website" in msg_lower:
-                session["state"] = "WEBSITE_SELECT_PRODUCT"
-                opts = self.get_website_product_options()
-                out_opts = opts[:10]
-                out_opts.append("🔙 Main Menu")
-                return {"text": "Select a product from our catalog:", "options": out_opts}
-            elif "custom" in msg_lower:
-                session["state"] = "CUSTOM_UPLOAD_DETAILS"
-                return {"text": "For custom products, please describe/upload details here.", "options": ["I have uploaded details", "🔙 Main Menu"]}
-            else:
-                 return {"text": "Please choose:", "options": ["Website Product", "Custom Product"]}
-
-        elif state == "WEBSITE_SELECT_PRODUCT":
-            # Simple product selection
-            if "main menu" in msg_lower:
-                session["state"] = "IDLE"
-                return self.WELCOME_MESSAGE
-            session["current_item"] = {"type": "Website", "product_name": message, "size": "NA"}
-            session["state"] = "WEBSITE_ASK_QTY"
-            return {"text": f"Selected '{message}'. Quantity?", "options": ["1", "2", "3"]}
-            
-        elif state == "WEBSITE_ASK_QTY":
-            session["current_item"]["qty"] = message
-            session["cart"].append(session["current_item"])
-            session["state"] = "ASK_ADD_MORE"
-            return {"text": "Added to cart. Add more?", "options": ["Yes", "No, Checkout"]}
-            
-        elif state == "CUSTOM_UPLOAD_DETAILS":
-            desc = message
-            if "[image uploaded]" in msg_lower:
-                url = message.split("] ")[1] if "] " in message else message
-                desc = f"Image: {url}"
-            
-            session["current_item"] = {"type": "Custom", "product_name": "Custom", "details": desc}
-            session["state"] = "CUSTOM_ASK_QTY"
-            return {"text": "Got it. Quantity?", "options": ["1", "2", "3"]}
-            
-        elif state == "CUSTOM_ASK_QTY":
-            session["current_item"]["qty"] = message
-            session["cart"].append(session["current_item"])
-            session["state"] = "ASK_ADD_MORE"
-            return {"text": "Added to cart. Add more?", "options": ["Yes", "No, Checkout"]}
-
-        elif state == "ASK_ADD_MORE":
-            if "yes" in msg_lower:
-                session["state"] = "ASK_ORDER_CATEGORY"
-                return {"text": "Category?", "options": ["Website Product", "Custom Product"]}
-            else:
-                # Checkout Sequence
-                session["state"] = "ASK_NAME"
-                return {"text": "Please enter your Full Name:", "options": []}
-
-        # Info Collection
-        elif state == "ASK_NAME":
-            session["user_info"]["name"] = message
-            session["state"] = "ASK_ADDRESS"
-            return {"text": "Please enter your Full Address:", "options": []}
-
-        elif state == "ASK_ADDRESS":
-            session["user_info"]["address"] = message
-            session["state"] = "ASK_PHONE"
-            return {"text": "Please enter your 10-digit Mobile Number:", "options": []}
-
-        elif state == "ASK_PHONE":
-            phone_input = message.replace(" ", "").replace("+91", "")
-            if len(phone_input) == 10 and phone_input.isdigit():
-                session["user_info"]["phone"] = phone_input
-                return self.finalize_order(user_phone)
-            else:
-                return {"text": "⚠️ Invalid number. Please enter exactly 10 digits:", "options": []}
-
-        # --- 4. Fallback Mechanism ---
+        # --- 3. Fallback Mechanism ---
         # If we reached here, the input didn't match the current state's expected input 
-        # (For open-ended inputs like Name/Details, we handled them in state blocks. 
+        # (For open-ended inputs like Name/Details, the state handlers always answer. 
         # But if state was IDLE and no keywords matched, we fall through)
         
         if state == "IDLE":
             session["fallback_count"] += 1
             if session["fallback_count"] >= 3:
                 session["fallback_count"] = 0
-                return {
-                    "text": "I'm having trouble finding that. Would you like to chat with a human expert on WhatsApp?",
-                    "options": ["Chat on WhatsApp", "🔙 Main Menu"]
-                }
+                return self.HUMAN_HANDOFF_MESSAGE
             
-        return {
-            "text": "I didn't quite catch that. Could you rephrase? 🤔",
-            "options": self.WELCOME_MESSAGE["options"]
-        }
+        return self.FALLBACK_MESSAGE
+
+    # --- State Handlers ---
+    # Each takes (session, message, msg_lower), may move session["state"] along an edge
+    # in conversation_flow.FLOW, and returns the reply (None = fall through to fallback).
+
+    def on_idle(self, session, message, msg_lower):
+        # Keywords live in intents.json (shared with chat_script.js); earlier intents win
+        intent, matched = self.intents.match(msg_lower)
+        self.turn.intent = intent or "none"
+
+        # Rule #1: Order Tracking
+        if intent == "track_order":
+            session["state"] = "CHECK_STATUS"
+            session["fallback_count"] = 0
+            return self.TRACK_ORDER_MESSAGE
+
+        # Rule #2: Product Recommendations
+        if intent == "collection":
+            session["fallback_count"] = 0
+            category = "all"
+            if "anime" in matched: category = "anime"
+            elif "marvel" in matched: category = "marvel"
+            elif "cars" in matched: category = "cars"
+            return self.COLLECTION_MESSAGES[category]
+
+        # Rule #3: Custom Orders
+        if intent == "custom_print":
+            session["fallback_count"] = 0
+            if "[image uploaded]" in msg_lower:
+                # Direct upload from idle, save as detail
+                url = message.split("] ")[1] if "] " in message else message
+                session["current_item"] = {"type": "Custom", "product_name": "Custom Upload", "details": f"Image: {url}"}
+                session["state"] = "CUSTOM_ASK_QTY"
+                return self.CUSTOM_IMAGE_RECEIVED_MESSAGE
+
+            return self.CUSTOM_PRINT_MESSAGE
+
+        # Rule #4: Policies
+        if intent == "policies":
+            session["fallback_count"] = 0
+            return self.POLICIES_MESSAGE
+
+        # Cart / Checkout
+        if intent == "checkout":
+            session["fallback_count"] = 0
+            return self.CHECKOUT_MESSAGE
+
+        # Chat on WhatsApp Action
+        if intent == "whatsapp":
+            return self.WHATSAPP_MESSAGE
+
+        # Existing Flow: Place Order
+        if intent == "place_order":
+            session["state"] = "ASK_ORDER_CATEGORY"
+            session["fallback_count"] = 0
+            return self.ORDER_CATEGORY_MESSAGE
+        return None
+
+    # CHECK STATUS
+    def on_check_status(self, session, message, msg_lower):
+        order_id = normalize_order_id(message)
+        status = self.get_order_status(order_id)
+        if status is not self.WARMING_UP_MESSAGE:
+            # While warming up, stay here so the customer can just resend the ID
+            session["state"] = "IDLE"
+        return status
+
+    # ORDER FLOW (Website/Custom)
+    def on_ask_order_category(self, session, message, msg_lower):
+        if "website" in msg_lower:
+            session["state"] = "WEBSITE_SELECT_PRODUCT"
+            return self.product_page_reply(session)
+        elif "custom" in msg_lower:
+            session["state"] = "CUSTOM_UPLOAD_DETAILS"
+            return self.CUSTOM_DETAILS_MESSAGE
+        else:
+            return self.ORDER_CATEGORY_RETRY_MESSAGE
+
+    def on_website_select_product(self, session, message, msg_lower):
+        # Simple product selection
+        if "main menu" in msg_lower:
+            session["state"] = "IDLE"
+            return self.WELCOME_MESSAGE
+        if msg_lower == self.MORE_PRODUCTS_OPTION.lower():
+            return self.product_page_reply(session, session.get("catalog_cursor"))
+
+        product = self.catalog.find_by_name(message)
+        if product is None:
+            # Typed rather than tapped: offer close catalog matches ("neon" -> Neon City Scape)
+            matches = self.catalog.search(message, limit=9)
+            if matches:
+                return {"text": "Did you mean one of these?", "options": [p['name'] for p in matches] + ["🔙 Main Menu"]}
+        else:
+            message = product['name']
+        session["current_item"] = {"type": "Website", "product_name": message, "size": "NA"}
+        session["state"] = "WEBSITE_ASK_QTY"
+        return self.PRODUCT_SELECTED_TEMPLATE.render(product=message)
+
+    def on_ask_qty(self, session, message, msg_lower):
+        # Shared by WEBSITE_ASK_QTY and CUSTOM_ASK_QTY
+        session["current_item"]["qty"] = message
+        session["cart"].append(session["current_item"])
+        session["state"] = "ASK_ADD_MORE"
+        return self.ADD_MORE_MESSAGE
+
+    def on_custom_upload_details(self, session, message, msg_lower):
+        desc = message
+        if "[image uploaded]" in msg_lower:
+            url = message.split("] ")[1] if "] " in message else message
+            desc = f"Image: {url}"
+        
+        session["current_item"] = {"type": "Custom", "product_name": "Custom", "details": desc}
+        session["state"] = "CUSTOM_ASK_QTY"
+        return self.CUSTOM_QTY_MESSAGE
+
+    def on_ask_add_more(self, session, message, msg_lower):
+        if "yes" in msg_lower:
+            session["state"] = "ASK_ORDER_CATEGORY"
+            return self.CATEGORY_AGAIN_MESSAGE
+        else:
+            # Checkout Sequence
+            session["state"] = "ASK_NAME"
+            return self.ASK_NAME_MESSAGE
+
+    # Info Collection
+    def on_ask_name(self, session, message, msg_lower):
+        session["user_info"]["name"] = message
+        session["state"] = "ASK_ADDRESS"
+        return self.ASK_ADDRESS_MESSAGE
+
+    def on_ask_address(self, session, message, msg_lower):
+        session["user_info"]["address"] = message
+        session["state"] = "ASK_PHONE"
+        return self.ASK_PHONE_MESSAGE
+
+    def on_ask_phone(self, session, message, msg_lower):
+        phone_input = message.replace(" ", "").replace("+91", "")
+        if len(phone_input) == 10 and phone_input.isdigit():
+            session["user_info"]["phone"] = phone_input
+            return self.finalize_order(session)
+        else:
+            return self.INVALID_PHONE_MESSAGE
 
-    def finalize_order(self, user_key):
-        session = self.user_sessions[user_key]
+    def finalize_order(self, session):
         order_id = self.save_order_batch(session)
         
         if order_id:
@@ -434,58 +714,290 @@ class IDecorBot:
             session["state"] = "IDLE"
             return {"text": msg_text, "options": ["Check Order Status", "Place another order"]}
         else:
-            return {"text": "⚠️ System Error: Could not save order. Please try again later.", "options": ["Main Menu"]}
+            return self.ORDER_SAVE_FAILED_MESSAGE
 
-def monitor_notifications(bot):
+def monitor_notifications(bot, lock=None):
+    # Every gunicorn worker starts this thread; only the lock holder polls the sheet.
+    # Followers retry the lock, so one takes over if the leader's process dies.
+    lock = lock or LeaderLock()
     print("\n[SYSTEM]: Background monitoring initialized.")
     while True:
-        results = bot.check_for_notifications()
-        time.sleep(5)
+        if not lock.is_leader:
+            if not lock.acquire():
+                time.sleep(15)
+                continue
+            print(f"[SYSTEM]: Worker {os.getpid()} is now the notification leader.")
+        try:
+            queued = bot.check_for_notifications()
+            delay = bot.poller.record_success(queued > 0 or bot.orders_awaiting_verification() > 0)
+        except Exception as e:
+            delay = bot.poller.record_error(e)
+            print(f"[ERROR]: Notification check failed ({e}); retrying in {delay:.0f}s.")
+        bot.poller.wait(delay)
+
+def notification_dispatch(bot):
+    # Sends queued confirmation messages, then marks them in the sheet. Every worker runs this:
+    # outbox claims are leased, so each message is taken by one worker at a time.
+    failures = 0
+    while True:
+        bot.dispatcher.wakeup.clear()
+        try:
+            sent = bot.dispatcher.dispatch()
+            confirmed = bot.dispatcher.confirm(bot.confirm_delivered) if bot.sheet else 0
+            failures = 0
+            if sent:
+                print(f"[SYSTEM]: Delivered {sent} order confirmations.")
+            if sent or confirmed:
+                continue
+        except Exception as e:
+            failures += 1
+            delay = min(2 ** failures, 300)
+            print(f"[ERROR]: Notification dispatch failed ({e}); retrying in {delay}s.")
+            time.sleep(delay)
+            continue
+        bot.dispatcher.wakeup.wait(5)
+
+def order_mirror(bot):
+    # Pushes new orders to the sheet and pulls staff edits back into the order store;
+    # backs off exponentially while the sheet is failing. Every worker runs this: pushes are
+    # leased per line, and pulls are claimed through the store, so one worker pulls per interval.
+    failures = 0
+    while True:
+        bot.mirror.wakeup.clear()
+        try:
+            written = bot.mirror.push(bot.write_order_rows)
+            if bot.sheet and bot.mirror.claim_pull():
+                with SHEETS_SECONDS.time("mirror_pull", errors=SHEETS_ERRORS):
+                    bot.mirror.pull(bot.sheet)
+            failures = 0
+            if written:
+                print(f"[SYSTEM]: Mirrored {written} order lines to the sheet.")
+                continue
+        except Exception as e:
+            failures += 1
+            delay = min(2 ** failures, 300)
+            print(f"[ERROR]: Order mirror failed ({e}); retrying in {delay}s.")
+            time.sleep(delay)
+            continue
+        bot.mirror.wakeup.wait(5)
 
 # Initialize Flask
-# We use static_url_path='' so that files effectively live at root /
-# static_folder='.' sets the serving directory to the current folder
-app = Flask(__name__, static_folder='.', static_url_path='')
+# The chat widget's files live next to the code, as do credentials and the instance/ folder with the
+# order and session databases, so only these files are served (see public_file below)
+PUBLIC_FILES = {"index.html", "chat_script.js", "chat_style.css", "intents.json", "posterman_bot_avatar_1767455871921.png"}
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
+def render_home_page():
+    # intents.json is inlined so the widget's offline engine has the bot's keyword rules on first load
+    with open(os.path.join(BASE_DIR, "index.html"), encoding="utf-8") as f: page = f.read()
+    with open(os.path.join(BASE_DIR, "intents.json"), encoding="utf-8") as f: intents = json.load(f)
+    script = '<script src="chat_script.js"></script>'
+    inline = '<script id="chat-intents" type="application/json">' + json.dumps(intents).replace("</", "<\\/") + '</script>'
+    return page.replace(script, inline + "\n    " + script, 1)
+
+HOME_PAGE = render_home_page()
+
 bot = IDecorBot()
 
-t = threading.Thread(target=monitor_notifications, args=(bot,), daemon=True)
+monitor_lock = LeaderLock()
+t = threading.Thread(target=monitor_notifications, args=(bot, monitor_lock), daemon=True)
 t.start()
 
+mirror = threading.Thread(target=order_mirror, args=(bot,), daemon=True)
+mirror.start()
+
+dispatcher = threading.Thread(target=notification_dispatch, args=(bot,), daemon=True)
+dispatcher.start()
+
+METRICS.callback("bot_sessions", "Conversation sessions held by this worker", lambda: len(bot.user_sessions))
+METRICS.callback("bot_session_bytes", "Approximate size of the stored sessions (serialized)",
+                 lambda: bot.user_sessions.stats()["approx_bytes"])
+METRICS.callback("bot_session_ttl_evictions_total", "Sessions expired after SESSION_TTL idle seconds",
+                 lambda: bot.user_sessions.counters()["evictions"]["ttl"], kind="counter")
+METRICS.callback("bot_session_lru_evictions_total", "Sessions evicted to stay under the session limit",
+                 lambda: bot.user_sessions.counters()["evictions"]["lru"], kind="counter")
+METRICS.callback("bot_session_hits_total", "Session lookups that found a live session",
+                 lambda: bot.user_sessions.counters()["hits"], kind="counter")
+METRICS.callback("bot_session_misses_total", "Session lookups that found none (new or expired)",
+                 lambda: bot.user_sessions.counters()["misses"], kind="counter")
+METRICS.callback("bot_notification_backlog", "Sheet rows the notification poller re-reads each tick",
+                 lambda: len(bot.notification_scanner.watch))
+METRICS.callback("bot_notification_outbox_pending", "Confirmation messages queued and not yet delivered",
+                 lambda: bot.outbox.count("pending"))
+METRICS.callback("bot_notification_outbox_failed", "Confirmation messages given up on after repeated failures",
+                 lambda: bot.outbox.count("failed"))
+METRICS.callback("bot_notifications_delivered_total", "Confirmation messages delivered by this worker",
+                 lambda: bot.dispatcher.stats["sent"], kind="counter")
+METRICS.callback("bot_notification_send_failures_total", "Confirmation send attempts that failed on this worker",
+                 lambda: bot.dispatcher.stats["failed"], kind="counter")
+METRICS.callback("bot_order_mirror_backlog", "Order lines not yet written to the sheet", lambda: bot.orders.unmirrored_count())
+METRICS.callback("bot_notification_poll_interval_seconds", "Current notification polling interval (leader worker)",
+                 lambda: bot.poller.interval)
+METRICS.callback("bot_notification_poll_errors_total", "Notification checks that failed", lambda: bot.poller.error_count, kind="counter")
+METRICS.callback("bot_sheet_ready", "1 once the Google Sheet is connected", lambda: int(bot.sheet_status == "ready"))
+METRICS.callback("bot_coalesced_lookups_total", "Order lookups and miss pulls that shared another request's fetch",
+                 lambda: bot.inflight.coalesced, kind="counter")
+METRICS.callback("bot_sheets_retries_total", "Sheets calls retried after quota/5xx errors",
+                 lambda: bot.sheets_client.stats["retries"] if bot.sheets_client else 0, kind="counter")
+
+# Sampling profiler for production debugging; /debug/profile is a 404 unless PROFILER_ENABLED=1,
+# and like the staff tools it needs ADMIN_TOKEN
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+# Staff tools (/admin/...) are a 404 unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+profiler = SamplingProfiler()
+
+STARTUP_SECONDS = time.perf_counter() - STARTUP_STARTED
+print(f"[SYSTEM]: Ready to serve in {STARTUP_SECONDS:.2f}s (Google Sheet connecting in background).")
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Route patterns, not raw paths, keep the label set bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - started, route, str(response.status_code))
+    return response
+
 @app.route('/')
 def home():
-    return app.send_static_file('index.html')
+    return Response(HOME_PAGE, mimetype='text/html')
+
+@app.route('/<path:filename>')
+def public_file(filename):
+    if filename not in PUBLIC_FILES: abort(404)
+    return send_from_directory(BASE_DIR, filename)
+
+@app.route('/health')
+def health():
+    # Liveness: orders are served from the local store, so a Sheets outage must not fail the check.
+    # "status" says whether the sheet is connected, still connecting or unreachable.
+    body = {
+        "status": bot.sheet_status,
+        "startup_seconds": round(STARTUP_SECONDS, 3),
+        "sheet_connect_seconds": round(bot.connect_seconds, 3) if bot.connect_seconds is not None else None,
+        "notification_leader": monitor_lock.is_leader,
+        "notifications": bot.poller.status(),
+        "notification_outbox": {
+            "pending": bot.outbox.count("pending"),
+            "failed": bot.outbox.count("failed"),
+            "awaiting_sheet": bot.outbox.count("sent", confirmed=False),
+            "transport": type(bot.dispatcher.transport).__name__ if bot.dispatcher.transport else None,
+        },
+    }
+    return jsonify(body), 200
 
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
     message = data.get('message', '')
     user_id = data.get('user_id', 'web_guest')
+    if not isinstance(message, str) or not isinstance(user_id, str):
+        return jsonify({'error': 'message and user_id must be strings'}), 400
+    retry_after = chat_retry_after(user_id, client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'), PROXY_HOPS))
+    if retry_after:
+        # A normal reply body, so the widget shows it instead of going offline
+        body, _ = response_body(bot.RATE_LIMITED_MESSAGE)
+        return Response(body, status=429, mimetype="application/json",
+                        headers={"Retry-After": str(math.ceil(retry_after))})
     response_data = bot.handle_message(user_id, message)
-    return jsonify({"response": response_data})
-
-import os
-import uuid
-
-# ... other imports ...
+    # Fixed and templated replies come pre-serialized; menu taps skip jsonify entirely
+    # (No 304s: If-None-Match on a POST is a precondition, and browsers never send it here anyway)
+    body, etag = response_body(response_data)
+    resp = Response(body, mimetype="application/json")
+    if etag: resp.set_etag(etag)
+    return resp
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", 10)) * 1024 * 1024
+# Werkzeug rejects larger bodies before parsing; the slack covers multipart headers
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024
+uploads = UploadStore(os.path.join(BASE_DIR, 'uploads'), max_bytes=MAX_UPLOAD_BYTES)
+
+def require_admin():
+    if not ADMIN_TOKEN: abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {ADMIN_TOKEN}"): abort(403)
+
+@app.route('/admin/verify-now', methods=['POST'])
+def verify_now():
+    # Staff just marked payments verified: check the sheet now instead of at the next poll
+    require_admin()
+    bot.poller.trigger()
+    return jsonify({'status': 'triggered'}), 202
+
+@app.route('/admin/retry-notifications', methods=['POST'])
+def retry_notifications():
+    # Confirmation messages given up on (e.g. while the gateway was down) are queued again
+    require_admin()
+    requeued = bot.outbox.retry_failed()
+    bot.dispatcher.wakeup.set()
+    return jsonify({'requeued': requeued}), 200
+
+@app.route('/metrics')
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/debug/profile')
+def profile():
+    # Samples every thread for ?seconds=N (default 10, max 60); collapsed stacks for flamegraph.pl/speedscope
+    if not PROFILER_ENABLED: abort(404)
+    require_admin()
+    seconds = min(max(request.args.get('seconds', 10, type=float), 0.1), 60)
+    stacks = profiler.profile(seconds)
+    if stacks is None:
+        return jsonify({'error': 'A profile is already running'}), 409
+    return Response(stacks, mimetype="text/plain")
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    UPLOADS.inc("too_large")
+    return jsonify({'error': f'File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)'}), 413
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    retry_after = RATE_LIMIT_UPLOAD.allow(client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'), PROXY_HOPS))
+    if retry_after:
+        RATE_LIMITED.inc("/upload", "ip")
+        return jsonify({'error': 'Too many uploads. Please wait a minute and try again.'}), 429, \
+            {"Retry-After": str(math.ceil(retry_after))}
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     
-    if file:
-        filename = f"{uuid.uuid4()}_{file.filename}"
-        upload_folder = os.path.join(app.static_folder, 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        file.save(os.path.join(upload_folder, filename))
-        
-        file_url = f"/uploads/{filename}"
-        return jsonify({'url': file_url})
+    start_time = time.perf_counter()
+    try:
+        filename, size, duplicate = uploads.save(file.stream, file.filename)
+    except UploadTooLarge as e:
+        UPLOADS.inc("too_large")
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        UPLOADS.inc("rejected")
+        return jsonify({'error': str(e)}), 400
+    UPLOAD_SECONDS.observe(time.perf_counter() - start_time)
+    UPLOAD_BYTES.observe(size)
+    UPLOADS.inc("duplicate" if duplicate else "stored")
+
+    return jsonify({'url': f"/uploads/{filename}", 'preview': f"/uploads/preview/{filename}"})
+
+@app.route('/uploads/<filename>')
+def uploaded_file(filename):
+    return send_from_directory(uploads.upload_dir, filename)
+
+@app.route('/uploads/preview/<filename>')
+def upload_preview(filename):
+    # Small JPEG once the background thumbnailer has run, the original until then
+    if os.path.basename(filename) != filename: abort(404)
+    path = uploads.preview_path(filename)
+    if not os.path.exists(path): abort(404)
+    return send_file(path, max_age=86400)
 
 if __name__ == "__main__":
     import socket